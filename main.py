@@ -1,30 +1,372 @@
+import argparse
 import os
-from modules.Plotter import Plotter
+import sys
 
+from modules.Batch import Batch
+from modules.Grades import GradesStore
+from modules.Metrics import LogSink, Metrics, PrometheusSink
+from modules.Profiles import Profiles
 
-def correct_csv(dir:str, file: str):
-    if "CORR" not in  file:
-        with open(os.path.join(dir, file), "r") as data_file:
-            tmp_file = data_file.readlines()
-            if "#" in tmp_file[0]:
-                tmp_line = tmp_file[0][1:]
-                tmp_file[0] = tmp_line
-            with open(os.path.join(dir, "CORR-" + file), "w") as corr_file:
-                corr_file.writelines(tmp_file)
+# matplotlib, scipy and pandas take most of a second to import: modules that pull them in (Plotter, Statistics,
+# TrapsheetCache, Benchmark) are imported by the commands using them, the rest of the CLI starts without them
 
-work_dir = "assets"
-file_list = os.listdir(work_dir)
+CACHE_DIR = ".cache/trapsheets"
+MANIFEST = ".cache/watch-manifest.json"
+GRADES_DB = ".cache/grades.sqlite3"
+IMAGE_CACHE = ".cache/images"
+ARCHIVE = ".cache/trapsheets.archive"
+BENCH_DIR = ".cache/bench"
+BENCH_BASELINE = ".cache/benchmark.json"
 
-for file in file_list:
-    correct_csv(work_dir, file)
 
-file_list = os.listdir(work_dir)
+def render(file_path: str, file_name: str = None, cache_dir: str = None, profiles: list = None,
+           decimate: int = None):
+    from modules.Plotter import Plotter
+    from modules.TrapsheetCache import TrapsheetCache
 
-# for file in file_list:
-#     if "CORR" in file:
-#         plotter = Plotter(os.path.join(work_dir, file))
-#         plotter.plot_case1()
-#         plotter.plot_case1(file_name=str(file.strip(".csv")))
+    plotter = Plotter(file_path, cache=TrapsheetCache(cache_dir) if cache_dir else None, decimate=decimate)
+    plotter.plot_case1(file_name=file_name, profiles=profiles)
+    track = plotter.track
+    if track.error is not None:
+        print("decimated %d -> %d groove samples, max error: %s" % (track.samples, track.fitted, ", ".join(
+            "%s %.3g" % (column, error) for column, error in track.error.items())))
 
-plotter = Plotter(os.path.join(work_dir, "CORR-TRAP-_FA-18C_hornet-0008.csv"))
-plotter.plot_case1()
+
+def batch(work_dir: str, out_dir: str = None, workers: int = None, report: str = None, cache_dir: str = None,
+          profiles: list = None, decimate: int = None):
+    batch_report = Batch(work_dir, out_dir, workers, cache_dir, profiles, decimate).run()
+    print(batch_report)
+    if report:
+        batch_report.write(report)
+    return batch_report
+
+
+def overlay(work_dir: str, file_name: str = "overlay", pilot: str = None, squadron: str = None,
+            by_grade: bool = False, cache_dir: str = None, profiles: list = None):
+    from modules.Plotter import Plotter
+    from modules.Trapsheet import Trapsheet
+    from modules.TrapsheetCache import TrapsheetCache
+
+    files = []
+    for file_path in Batch(work_dir).trapsheets():
+        meta = Trapsheet.metadata(file_path)
+        if pilot is not None and pilot not in (meta["pilot"], meta["callsign"], meta["player"]):
+            continue
+        if squadron is not None and not (meta["callsign"] or "").startswith(squadron):
+            continue
+        files.append(file_path)
+    outputs = Plotter.plot_overlay(files, file_name=file_name, show=file_name is None, profiles=profiles,
+                                   by_grade=by_grade, cache=TrapsheetCache(cache_dir) if cache_dir else None)
+    print("%d trapsheets  %s" % (len(files), " ".join(outputs)))
+
+
+def card(file_path: str, file_name: str = None):
+    from modules.Card import Card
+    from modules.Pass import Pass
+
+    file_name = file_name or os.path.splitext(os.path.basename(file_path))[0] + "-card.png"
+    print(Card().save(Pass.load(file_path), file_name))
+
+
+def tail(file_path: str, file_name: str = None, interval: float = 2., idle: float = 30.):
+    from modules.Card import Card
+    from modules.Keys import KeysCSV as K
+    from modules.Tail import TrapsheetTail
+
+    file_name = file_name or os.path.splitext(os.path.basename(file_path))[0] + "-card.png"
+    card = Card()
+
+    def update(trapsheet: TrapsheetTail, rows: int):
+        data = trapsheet.data()
+        runs = trapsheet.steps.runs
+        card.save(data, file_name, trapsheet.groove)
+        print("%5d rows (+%d)  %-4s %6.2f cbls  %-5s %s" % (len(data), rows, runs[-1].step if runs else "-",
+                                                       runs[-1].distance[1] if runs else float("nan"),
+                                                       data[K.grade()][-1], file_name))
+
+    TrapsheetTail(file_path).follow(update, interval, idle)
+
+
+def watch(work_dir: str, out_dir: str = None, workers: int = None, cache_dir: str = None, manifest: str = MANIFEST,
+          interval: float = 2., baseline: bool = False, grades_db: str = GRADES_DB):
+    from modules.Watcher import Manifest, Watcher
+
+    store = GradesStore(grades_db)
+    watcher = Watcher(work_dir, Manifest(manifest), Batch(work_dir, out_dir, workers, cache_dir), interval=interval,
+                      on_grades=store.ingest)
+    if baseline:
+        watcher.baseline()
+    watcher.run()
+
+
+def grades_ingest(files: list, grades_db: str = GRADES_DB, workers: int = None):
+    import time
+
+    start = time.perf_counter()
+    added, duplicates = GradesStore(grades_db).ingest_many(files, workers)
+    print("%d passes added, %d rows already stored, %d files (%.2fs)" % (added, duplicates, len(files),
+                                                                     time.perf_counter() - start))
+
+
+def grades_query(grades_db: str = GRADES_DB, **filters):
+    for row in GradesStore(grades_db).passes(**filters):
+        print("%s  %-24s %2s  %-12s %-6s %s" % (row["os_date"], row["pilot"], row["pass"], row["grade"],
+                                               row["carrier_type"], row["details"] or ""))
+
+
+def stats(work_dir: str, pilot: str = None, squadron: str = None, bin_width: float = 1., cache_dir: str = None):
+    from modules.Statistics import Statistics
+    from modules.TrapsheetCache import TrapsheetCache
+
+    files = Batch(work_dir).trapsheets()
+    statistics = Statistics.from_files(files, TrapsheetCache(cache_dir) if cache_dir else None)
+    statistics = statistics.select(pilot=pilot, squadron=squadron)
+    print("%d passes, %d groove samples" % (statistics.passes, len(statistics.samples)))
+    print(statistics.by_step().round(2).to_string())
+    print(statistics.by_distance(bin_width).round(2).to_string())
+
+
+def compact(work_dir: str, archive: str = ARCHIVE, cache_dir: str = None):
+    from modules.Archive import Archive
+    from modules.TrapsheetCache import TrapsheetCache
+
+    with Archive(archive) as packed:
+        added = packed.add(Batch(work_dir).trapsheets(), TrapsheetCache(cache_dir) if cache_dir else None)
+        print("%d trapsheets added, %d in %s (%.1f MiB)" % (len(added), len(packed), archive,
+                                                            os.path.getsize(archive) / 2 ** 20))
+
+
+def regrade(work_dir: str, cache_dir: str = None, verbose: bool = False, archive: str = None):
+    import time
+
+    from modules.Regrade import Regrade
+    from modules.TrapsheetCache import TrapsheetCache
+
+    start = time.perf_counter()
+    if archive:
+        from modules.Archive import Archive
+
+        packed = Archive(archive)
+        regraded = Regrade.from_passes(packed.passes())
+        files = regraded.names
+    else:
+        files = Batch(work_dir).trapsheets()
+        regraded = Regrade.from_files(files, TrapsheetCache(cache_dir) if cache_dir else None)
+    seconds = time.perf_counter() - start
+    mismatches = regraded.mismatches()
+    if mismatches:
+        print("%-8s %-8s %-4s %s" % ("recorded", "regraded", "step", "trapsheet"))
+    for name, step, computed, recorded in mismatches:
+        print("%-8s %-8s %-4s %s" % (recorded or "-", computed or "-", step, os.path.basename(name)))
+    if verbose:
+        for i, name in enumerate(regraded.names):
+            print("%-48s %s" % (regraded.details(i), os.path.basename(name)))
+    print("%d passes, %.1f%% of the calls as recorded, %d differ (%.2fs)" % (
+        len(files), regraded.agreement * 100, len(mismatches), seconds))
+
+
+def bench(work_dir: str, scales: list = None, repeat: int = 3, profile: str = Profiles.PRINT.name,
+          baseline: str = BENCH_BASELINE, save: bool = False, threshold: float = .25) -> bool:
+    """ Runs the benchmark suite, returns False when a stage regressed against the baseline """
+    from modules.Benchmark import Benchmark
+
+    results = Benchmark(Benchmark.cases_for(work_dir, scales, BENCH_DIR), repeat, profile).run()
+    previous = Benchmark.load(baseline) if baseline and os.path.exists(baseline) else None
+    regressions = Benchmark.regressions(results, previous, threshold) if previous else []
+    print(Benchmark.report(results, previous, regressions))
+    if save:
+        Benchmark.save(results, baseline)
+        print("baseline saved to %s" % baseline)
+    return not regressions
+
+
+def bot(work_dir: str, out_dir: str, workers: int = None, depth: int = 16, cache_dir: str = None,
+        grades_db: str = GRADES_DB, fake: bool = False, image_cache: str = IMAGE_CACHE, image_cache_mb: int = 512,
+        profile: str = Profiles.DISCORD_PREVIEW.name):
+    import asyncio
+
+    from modules.Bot import AirbossBot, DiscordGateway, FakeGateway, RenderQueue
+    from modules.ImageCache import ImageCache
+
+    async def run():
+        gateway = FakeGateway() if fake else DiscordGateway(os.environ["DISCORD_TOKEN"])
+        images = ImageCache(image_cache, image_cache_mb * 1024 * 1024) if image_cache else None
+        airboss = AirbossBot(gateway, RenderQueue(out_dir, workers, depth, cache_dir, profile), work_dir,
+                             GradesStore(grades_db), images)
+        if not fake:
+            await airboss.run()
+            return
+
+        async def console():
+            loop = asyncio.get_running_loop()
+            while line := await loop.run_in_executor(None, sys.stdin.readline):
+                gateway.post(line.strip())
+            gateway.close()
+
+        async def replies():
+            while True:
+                message, content, files = await gateway.replies.get()
+                print("> %s\n%s %s" % (message.content, content, " ".join(files)))
+
+        printer = asyncio.create_task(replies())
+        await asyncio.gather(console(), airboss.run())
+        while not gateway.replies.empty():
+            await asyncio.sleep(0)
+        printer.cancel()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Airboss trapsheet plotter")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="parsed trapsheet cache (default %(default)s)")
+    parser.add_argument("--no-cache", action="store_const", const=None, dest="cache_dir",
+                        help="always parse the csv files")
+    parser.add_argument("--grades-db", default=GRADES_DB, help="LSO grades database (default %(default)s)")
+    parser.add_argument("--metrics-log", action="store_true", help="log stage timings as JSON lines on stderr")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write counters and histograms in the Prometheus text format to this file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser("render", help="plot a single trapsheet")
+    render_parser.add_argument("file")
+    render_parser.add_argument("-o", "--output", default=None, help="save the plot as OUTPUT.png/OUTPUT-alpha.png")
+    render_parser.add_argument("--profile", action="append", choices=sorted(Profiles.all()), dest="profiles",
+                               help="output variant to write, repeatable (default print and overlay)")
+    render_parser.add_argument("--decimate", type=int, default=None,
+                               help="fit the track through about this many groove samples (more when every "
+                                    "step's AoA/GSE/LUE extremes are more) and report the error")
+
+    batch_parser = commands.add_parser("batch", help="render every trapsheet in a directory")
+    batch_parser.add_argument("work_dir", nargs="?", default="assets")
+    batch_parser.add_argument("-o", "--out-dir", default=None)
+    batch_parser.add_argument("-j", "--workers", type=int, default=None, help="defaults to the number of cores")
+    batch_parser.add_argument("--report", default=None, help="write per-file timings and failures as csv")
+    batch_parser.add_argument("--profile", action="append", choices=sorted(Profiles.all()), dest="profiles",
+                              help="output variant to write, repeatable (default print and overlay)")
+    batch_parser.add_argument("--decimate", type=int, default=None,
+                              help="fit the tracks through about this many groove samples (more when every "
+                                   "step's AoA/GSE/LUE extremes are more)")
+
+    overlay_parser = commands.add_parser("overlay", help="draw many passes on one chart")
+    overlay_parser.add_argument("work_dir", nargs="?", default="assets")
+    overlay_parser.add_argument("-o", "--output", default="overlay", help="save as OUTPUT.png/OUTPUT-alpha.png")
+    overlay_parser.add_argument("--pilot", help="full name, callsign or player")
+    overlay_parser.add_argument("--squadron", help="callsign prefix")
+    overlay_parser.add_argument("--by-grade", action="store_true", help="colour the tracks by final LSO grade")
+    overlay_parser.add_argument("--profile", action="append", choices=sorted(Profiles.all()), dest="profiles",
+                                help="output variant to write, repeatable (default print and overlay)")
+
+    card_parser = commands.add_parser("card", help="small summary card of a trapsheet, without matplotlib")
+    card_parser.add_argument("file")
+    card_parser.add_argument("-o", "--output", default=None, help="png file (default <trapsheet>-card.png)")
+
+    tail_parser = commands.add_parser("tail", help="follow a trapsheet being written, updating its card")
+    tail_parser.add_argument("file")
+    tail_parser.add_argument("-o", "--output", default=None, help="png file (default <trapsheet>-card.png)")
+    tail_parser.add_argument("--interval", type=float, default=2., help="seconds between reads")
+    tail_parser.add_argument("--idle", type=float, default=30., help="stop after the file did not grow this long")
+
+    watch_parser = commands.add_parser("watch", help="render new or changed trapsheets as they are written")
+    watch_parser.add_argument("work_dir", nargs="?", default="assets")
+    watch_parser.add_argument("-o", "--out-dir", default=None)
+    watch_parser.add_argument("-j", "--workers", type=int, default=None, help="defaults to the number of cores")
+    watch_parser.add_argument("--manifest", default=MANIFEST, help="processed files (default %(default)s)")
+    watch_parser.add_argument("--interval", type=float, default=2., help="seconds between polls")
+    watch_parser.add_argument("--baseline", action="store_true",
+                              help="mark the files already in the directory as processed instead of rendering them")
+
+    grades_parser = commands.add_parser("grades", help="LSO grades store")
+    grades_commands = grades_parser.add_subparsers(dest="grades_command", required=True)
+    ingest_parser = grades_commands.add_parser("ingest", help="load *_LSOgrades.csv files")
+    ingest_parser.add_argument("files", nargs="+")
+    ingest_parser.add_argument("-j", "--workers", type=int, default=None, help="defaults to the number of cores")
+    query_parser = grades_commands.add_parser("query", help="list passes, newest first")
+    query_parser.add_argument("--pilot", help="full name, callsign or player")
+    query_parser.add_argument("--carrier", help="carrier type or name")
+    query_parser.add_argument("--airframe")
+    query_parser.add_argument("--case", type=int)
+    query_parser.add_argument("--since", help="ISO date")
+    query_parser.add_argument("--until", help="ISO date")
+    query_parser.add_argument("-n", "--limit", type=int)
+
+    stats_parser = commands.add_parser("stats", help="groove statistics per step and distance")
+    stats_parser.add_argument("work_dir", nargs="?", default="assets")
+    stats_parser.add_argument("--pilot", help="full name, callsign or player")
+    stats_parser.add_argument("--squadron", help="callsign prefix")
+    stats_parser.add_argument("--bin", type=float, default=1., help="distance bin width [cbls]")
+
+    bot_parser = commands.add_parser("bot", help="run the Discord bot (token from DISCORD_TOKEN)")
+    bot_parser.add_argument("work_dir", nargs="?", default="assets")
+    bot_parser.add_argument("-o", "--out-dir", default=".cache/renders")
+    bot_parser.add_argument("-j", "--workers", type=int, default=None, help="defaults to the number of cores")
+    bot_parser.add_argument("--depth", type=int, default=16, help="renders allowed to wait before replying busy")
+    bot_parser.add_argument("--image-cache", default=IMAGE_CACHE, help="rendered images (default %(default)s)")
+    bot_parser.add_argument("--no-image-cache", action="store_const", const=None, dest="image_cache")
+    bot_parser.add_argument("--image-cache-mb", type=int, default=512, help="size cap of the image cache")
+    bot_parser.add_argument("--profile", choices=sorted(Profiles.all()), default=Profiles.DISCORD_PREVIEW.name,
+                            help="image variant sent to the channel (default %(default)s)")
+    bot_parser.add_argument("--fake", action="store_true", help="read commands from stdin instead of Discord")
+
+    regrade_parser = commands.add_parser("regrade", help="recompute the deviation calls and compare them with the "
+                                                         "recorded details")
+    regrade_parser.add_argument("work_dir", nargs="?", default="assets")
+    regrade_parser.add_argument("-v", "--verbose", action="store_true", help="also print the recomputed details")
+    regrade_parser.add_argument("--archive", default=None, help="read the passes from this archive instead")
+
+    compact_parser = commands.add_parser("compact", help="pack the trapsheets into one archive file")
+    compact_parser.add_argument("work_dir", nargs="?", default="assets")
+    compact_parser.add_argument("--archive", default=ARCHIVE, help="archive to append to (default %(default)s)")
+
+    bench_parser = commands.add_parser("bench", help="time the load, segment, interpolate and render stages")
+    bench_parser.add_argument("work_dir", nargs="?", default="assets")
+    bench_parser.add_argument("--scale", type=int, action="append", dest="scales",
+                              help="also time the longest pass sampled SCALE times as densely, repeatable")
+    bench_parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the median is reported")
+    bench_parser.add_argument("--profile", choices=sorted(Profiles.all()), default=Profiles.PRINT.name,
+                              help="output written by the savefig stage (default %(default)s)")
+    bench_parser.add_argument("--baseline", default=BENCH_BASELINE, help="results to compare against "
+                                                                         "(default %(default)s)")
+    bench_parser.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    bench_parser.add_argument("--threshold", type=float, default=.25,
+                              help="relative slowdown or memory growth flagged as a regression")
+
+    args = parser.parse_args()
+    sinks = []
+    if args.metrics_log:
+        sinks.append(LogSink())
+    if args.metrics_file:
+        sinks.append(PrometheusSink(args.metrics_file))
+    if sinks:
+        Metrics.enable(sinks)
+    if args.command == "render":
+        render(args.file, args.output, args.cache_dir, args.profiles, args.decimate)
+    elif args.command == "batch":
+        batch(args.work_dir, args.out_dir, args.workers, args.report, args.cache_dir, args.profiles, args.decimate)
+    elif args.command == "overlay":
+        overlay(args.work_dir, args.output, args.pilot, args.squadron, args.by_grade, args.cache_dir, args.profiles)
+    elif args.command == "card":
+        card(args.file, args.output)
+    elif args.command == "tail":
+        tail(args.file, args.output, args.interval, args.idle)
+    elif args.command == "watch":
+        watch(args.work_dir, args.out_dir, args.workers, args.cache_dir, args.manifest, args.interval, args.baseline,
+              args.grades_db)
+    elif args.command == "bot":
+        bot(args.work_dir, args.out_dir, args.workers, args.depth, args.cache_dir, args.grades_db, args.fake,
+            args.image_cache, args.image_cache_mb, args.profile)
+    elif args.command == "bench":
+        if not bench(args.work_dir, args.scales, args.repeat, args.profile, args.baseline, args.save, args.threshold):
+            sys.exit(1)
+    elif args.command == "regrade":
+        regrade(args.work_dir, args.cache_dir, args.verbose, args.archive)
+    elif args.command == "compact":
+        compact(args.work_dir, args.archive, args.cache_dir)
+    elif args.command == "stats":
+        stats(args.work_dir, args.pilot, args.squadron, args.bin, args.cache_dir)
+    elif args.command == "grades" and args.grades_command == "ingest":
+        grades_ingest(args.files, args.grades_db, args.workers)
+    elif args.command == "grades" and args.grades_command == "query":
+        grades_query(args.grades_db, pilot=args.pilot, carrier=args.carrier, airframe=args.airframe, case=args.case,
+                     since=args.since, until=args.until, limit=args.limit)
+    Metrics.flush()
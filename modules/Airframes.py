@@ -0,0 +1,196 @@
+import os
+import re
+
+from modules.Keys import KeysAirframes as AF, KeysAoA as AoA, KeysGRV as GRV, KeysGS as GS
+from modules.Trapsheet import Trapsheet
+from modules.Utils import Utils
+
+
+class AirframeLimits(object):
+    """ Grading limits of one airframe and the limit envelopes the background draws from them. The tables are
+        shared by every pass of the airframe, treat them as read-only.
+    """
+    # x axis of the envelopes [cbls] as linspace arguments, same grid as Background.limits_x_axis()
+    ENVELOPE_X = (0, 15, 15)
+    # the groove and glideslope limits are drawn from 290 ft behind the ramp
+    LONGITUDINAL_CORRECTION_FT = 290
+    LATERAL_CORRECTION_FT = 0
+    VERTICAL_CORRECTION_FT = 0
+    # groove limits are lineup angles off the landing area centreline, which is angled 9 deg from the ship's axis
+    GROOVE_ANGLE_CORRECTION = 9
+
+    def __init__(self, name: str, aoa: dict, gs: dict, gse: dict, grv: dict):
+        self.name = name
+        self.aoa = aoa
+        self.gs = gs
+        self.gse = gse
+        self.grv = grv
+        self.__groove_envelope = None
+        self.__glideslope_envelope = None
+
+    def limits(self) -> dict:
+        return {"aoa": self.aoa, "gs": self.gs, "gse": self.gse, "grv": self.grv}
+
+    def groove_envelope(self) -> tuple:
+        """ x [cbls] and lateral offset [cbls] of every groove limit line, computed once per airframe """
+        if self.__groove_envelope is None:
+            import numpy
+
+            x = numpy.linspace(*self.ENVELOPE_X)
+            self.__groove_envelope = (
+                x + Utils.feet_to_cbl(self.LONGITUDINAL_CORRECTION_FT),
+                {k: numpy.tan(numpy.radians(v + self.GROOVE_ANGLE_CORRECTION)) * x
+                    + Utils.feet_to_cbl(self.LATERAL_CORRECTION_FT) for k, v in self.grv.items()})
+        return self.__groove_envelope
+
+    def glideslope_envelope(self) -> tuple:
+        """ x [cbls] and height [feet] of every glideslope limit line, computed once per airframe """
+        if self.__glideslope_envelope is None:
+            import numpy
+
+            x = numpy.linspace(*self.ENVELOPE_X)
+            self.__glideslope_envelope = (
+                x + Utils.feet_to_cbl(self.LONGITUDINAL_CORRECTION_FT),
+                {k: numpy.tan(numpy.radians(v)) * Utils.cbl_to_feet(x) + self.VERTICAL_CORRECTION_FT
+                 for k, v in self.gs.items()})
+        return self.__glideslope_envelope
+
+
+class Airframes(object):
+    """ Registry of airframe limits. AoA limits come from the Airboss parameter dump in assets/aoa.txt, parsed once
+        per process; glideslope and lineup limits are the Airboss grading thresholds.
+    """
+    AOA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "aoa.txt")
+    # airframe -> DCS type names it is flown as, matched against the trapsheet file name
+    TYPES = {
+        AF.f18(): ("FA-18C",),
+        AF.f14(): ("F-14",),
+        AF.av8(): ("AV8BNA", "AV-8"),
+        AF.t45(): ("T-45",),
+        AF.a4(): ("A-4E-C",),
+    }
+    # airframe used for unknown types, as Airboss does
+    DEFAULT = AF.f18()
+    # aoa.txt parameter -> limit key
+    AOA_KEYS = {
+        "SLOW": AoA.slo_hi(),
+        "Slow": AoA.slo_med(),
+        "OnSpeedMax": AoA.slo_lo(),
+        "OnSpeed": AoA.ok(),
+        "OnSpeedMin": AoA.fast_lo(),
+        "Fast": AoA.fast_med(),
+        "FAST": AoA.fast_hi(),
+    }
+
+    __HEADER = re.compile(r"^--\s*(?P<name>.+?)\s+parameters")
+    __PARAMETER = re.compile(r"^aoa\.(?P<key>\w+)\s*=\s*(?:self:_AoAUnit2Deg\(\s*\w+\s*,\s*(?P<units>[-\d.]+)\s*\)"
+                             r"|(?P<deg>[-\d.]+))")
+    __registry = None
+
+    @staticmethod
+    def aoa_unit_to_deg(units: float) -> float:
+        """ F-14 AoA units (0-30) to degrees, linear with 0 = -10 deg and 30 = +40 deg as in Airboss """
+        return units * 50 / 30 - 10
+
+    @staticmethod
+    def parse_aoa(text: str) -> dict:
+        """ airframe -> AoA limits of the parameter blocks in an Airboss aoa dump """
+        tables = {}
+        table = None
+        for line in text.splitlines():
+            line = line.strip()
+            header = Airframes.__HEADER.match(line)
+            if header:
+                name = header.group("name")
+                airframe = next((a for a in Airframes.TYPES if name.startswith(a)), name)
+                table = tables.setdefault(airframe, {})
+                continue
+            parameter = Airframes.__PARAMETER.match(line)
+            if parameter and table is not None and parameter.group("key") in Airframes.AOA_KEYS:
+                units = parameter.group("units")
+                value = Airframes.aoa_unit_to_deg(float(units)) if units else float(parameter.group("deg"))
+                table[Airframes.AOA_KEYS[parameter.group("key")]] = value
+        return tables
+
+    @staticmethod
+    def __limits_gs(airframe: str) -> tuple:
+        if airframe == AF.av8():
+            return ({
+                GS.___hi___(): 5.4,
+                GS.__hi__(): 4.9,
+                GS.hi(): 4.2,
+                GS.gs(): 3.5,
+                GS.lo(): 3,
+                GS.__lo__(): 2.3,
+                GS.___lo___(): 2.0,
+            }, {
+                GS.___hi___(): 1.9,
+                GS.__hi__(): 1.4,
+                GS.hi(): 0.7,
+                GS.gs(): 0,
+                GS.lo(): -0.5,
+                GS.__lo__(): -1.2,
+                GS.___lo___(): -1.5,
+            })
+        return ({
+            GS.___hi___(): 5.0,
+            GS.__hi__(): 4.3,
+            GS.hi(): 3.9,
+            GS.gs(): 3.5,
+            GS.lo(): 3.2,
+            GS.__lo__(): 2.9,
+            GS.___lo___(): 2.6,
+        }, {
+            GS.___hi___(): 1.5,
+            GS.__hi__(): 0.8,
+            GS.hi(): 0.4,
+            GS.gs(): 0,
+            GS.lo(): -0.3,
+            GS.__lo__(): -0.6,
+            GS.___lo___(): -0.9,
+        })
+
+    @staticmethod
+    def __limits_grv() -> dict:
+        return {
+            GRV.___lul___(): -3,
+            GRV.__lul__(): -1,
+            GRV.lul(): -.5,
+            GRV.ok(): 0,
+            GRV.lur(): .5,
+            GRV.__lur__(): 1,
+            GRV.___lur___(): 3,
+        }
+
+    @staticmethod
+    def registry() -> dict:
+        """ airframe -> AirframeLimits, built on first use """
+        if Airframes.__registry is None:
+            with open(Airframes.AOA_FILE, "r") as aoa_file:
+                aoa = Airframes.parse_aoa(aoa_file.read())
+            grv = Airframes.__limits_grv()
+            registry = {}
+            for airframe, table in aoa.items():
+                if len(table) != len(Airframes.AOA_KEYS):
+                    raise ValueError("incomplete AoA limits for %s in %s" % (airframe, Airframes.AOA_FILE))
+                gs, gse = Airframes.__limits_gs(airframe)
+                registry[airframe] = AirframeLimits(airframe, table, gs, gse, grv)
+            Airframes.__registry = registry
+        return Airframes.__registry
+
+    @staticmethod
+    def airframe(file_path: str) -> str:
+        """ Registry key of the airframe a trapsheet was flown in, DEFAULT when it is not known """
+        name = Trapsheet.metadata(file_path)["airframe"] or os.path.basename(file_path)
+        for airframe, types in Airframes.TYPES.items():
+            if any(t in name for t in types) and airframe in Airframes.registry():
+                return airframe
+        return Airframes.DEFAULT
+
+    @staticmethod
+    def get(airframe: str) -> AirframeLimits:
+        return Airframes.registry()[airframe]
+
+    @staticmethod
+    def for_file(file_path: str) -> AirframeLimits:
+        return Airframes.get(Airframes.airframe(file_path))
@@ -0,0 +1,193 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from modules.Pass import Pass
+from modules.TrapsheetCache import TrapsheetCache
+
+
+class Archive(object):
+    """ Many trapsheets in one append-only file, read through a memory map without opening the csv files.
+
+        Layout: MAGIC, then one record per pass (its float32 (column, row) block and the codes of its text
+        columns, each 8 byte aligned), then a JSON index and a footer (index offset, index length, MAGIC).
+        Adding passes appends their records and a new index after the old one, so bytes already written never
+        change; readers use the index the last complete footer points to. A source that changed since it was
+        archived gets a new record, the old one is left unreferenced.
+
+        Index entries are keyed by the absolute path of their source trapsheet (servers write the same file names
+        to different directories) and hold the pass metadata (carrier, pilot, callsign, player, airframe, number),
+        where its arrays are, its text categories and the size and mtime of the source.
+    """
+    MAGIC = b"AIRBOSSA"
+    VERSION = 2
+    __FOOTER = struct.Struct("<QQ8s")
+    ALIGN = 8
+    # find() argument -> index entry fields it matches
+    KEYS = {"pilot": ("pilot", "callsign", "player"), "carrier": ("carrier",), "airframe": ("airframe",),
+            "number": ("number",)}
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.__file = None
+        self.__map = None
+        self.__entries = {}
+        self.__keys = {}
+        if os.path.exists(file_path) and os.path.getsize(file_path) > len(self.MAGIC):
+            self.__open()
+
+    def __open(self):
+        self.close()
+        self.__file = open(self.file_path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__map[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError("%s is not a trapsheet archive" % self.file_path)
+        index = self.__last_index()
+        if index is None:
+            raise ValueError("%s has no complete index" % self.file_path)
+        if index["version"] != self.VERSION:
+            raise ValueError("%s is archive version %s, expected %d" % (self.file_path, index["version"],
+                                                                         self.VERSION))
+        self.__entries = {entry["source"]: entry for entry in index["passes"]}
+        self.__index()
+
+    def __last_index(self) -> dict:
+        """ The index of the last complete footer. A write that was cut off (the process was killed, the disk filled
+            up) leaves bytes without a footer after it, the index written before them is still valid.
+        """
+        end = len(self.__map)
+        while end >= len(self.MAGIC) + self.__FOOTER.size:
+            start = end - self.__FOOTER.size
+            offset, length, magic = self.__FOOTER.unpack(self.__map[start:end])
+            # the index is right before its footer, a MAGIC inside record bytes does not point at itself
+            if magic == self.MAGIC and offset + length == start:
+                try:
+                    return json.loads(self.__map[offset:start].decode("utf-8"))
+                except ValueError:
+                    pass
+            end = self.__map.rfind(self.MAGIC, len(self.MAGIC), end - 1) + len(self.MAGIC)
+            if end < len(self.MAGIC):
+                break
+        return None
+
+    def __index(self):
+        """ Sources of the passes per value of every key find() takes """
+        self.__keys = {key: {} for key in self.KEYS}
+        for entry in self.__entries.values():
+            for key, sources in self.__keys.items():
+                for value in {entry[field] for field in self.KEYS[key]}:
+                    sources.setdefault(value, []).append(entry["source"])
+
+    def close(self):
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                # passes loaded earlier still view the map, it is unmapped once they are gone
+                pass
+            self.__file.close()
+        self.__map = self.__file = None
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, file_path: str) -> bool:
+        return os.path.abspath(file_path) in self.__entries
+
+    @property
+    def entries(self) -> list:
+        return list(self.__entries.values())
+
+    @staticmethod
+    def __pad(archive_file):
+        archive_file.write(b"\0" * (-archive_file.tell() % Archive.ALIGN))
+
+    def add(self, file_paths: list, cache: TrapsheetCache = None) -> list:
+        """ Appends the passes of the trapsheets not archived yet, or changed since, and writes the new index.
+            Returns the file paths added. Every pass is loaded before the archive is written, and a write that
+            fails is truncated away, so a trapsheet that cannot be read leaves the archive as it was.
+        """
+        pending = []
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            entry = self.__entries.get(os.path.abspath(file_path))
+            if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                pending.append((file_path, stat))
+        if not pending:
+            return []
+        loaded = [(file_path, stat, Pass.load(file_path, cache)) for file_path, stat in pending]
+
+        # the old index and footer stay where they are, the new records and index go after them
+        entries = dict(self.__entries)
+        with open(self.file_path, "ab") as archive_file:
+            size = archive_file.tell()
+            try:
+                if size == 0:
+                    archive_file.write(self.MAGIC)
+                for file_path, stat, data in loaded:
+                    self.__pad(archive_file)
+                    entry = {"source": os.path.abspath(file_path), "name": os.path.basename(file_path),
+                             "rows": len(data), "offset": archive_file.tell(), "size": stat.st_size,
+                             "mtime_ns": stat.st_mtime_ns, "codes": {}}
+                    entry.update({attribute: getattr(data, attribute) for attribute in
+                                  ("carrier", "pilot", "callsign", "player", "airframe", "number")})
+                    archive_file.write(np.ascontiguousarray(data.values).tobytes())
+                    for column in Pass.TEXT:
+                        self.__pad(archive_file)
+                        codes = data.codes(column)
+                        entry["codes"][column] = {"offset": archive_file.tell(), "dtype": codes.dtype.str,
+                                                  "categories": list(data.categories(column))}
+                        archive_file.write(codes.tobytes())
+                    entries[entry["source"]] = entry
+                self.__pad(archive_file)
+                index = json.dumps({"version": self.VERSION, "passes": list(entries.values())}).encode("utf-8")
+                offset = archive_file.tell()
+                archive_file.write(index)
+                archive_file.write(self.__FOOTER.pack(offset, len(index), self.MAGIC))
+                archive_file.flush()
+                os.fsync(archive_file.fileno())
+            except BaseException:
+                archive_file.truncate(size)
+                raise
+        self.__open()
+        return [file_path for file_path, _ in pending]
+
+    def find(self, pilot: str = None, carrier: str = None, airframe: str = None, number: int = None) -> list:
+        """ Index entries of the matching passes. pilot: full name, callsign or player """
+        sources = None
+        for key, value in (("pilot", pilot), ("carrier", carrier), ("airframe", airframe), ("number", number)):
+            if value is None:
+                continue
+            matching = self.__keys.get(key, {}).get(value, [])
+            if sources is not None:
+                matching = set(matching)
+                matching = [source for source in sources if source in matching]
+            sources = matching
+        return [self.__entries[source] for source in (self.__entries if sources is None else sources)]
+
+    def load(self, file_path: str) -> Pass:
+        """ Pass of an archived trapsheet (by its source path), its arrays view the memory map """
+        entry = self.__entries[os.path.abspath(file_path)]
+        rows = entry["rows"]
+        values = np.frombuffer(self.__map, dtype=np.float32, count=len(Pass.NUMERIC) * rows,
+                               offset=entry["offset"]).reshape(len(Pass.NUMERIC), rows)
+        codes, categories = {}, {}
+        for column, stored in entry["codes"].items():
+            codes[column] = np.frombuffer(self.__map, dtype=np.dtype(stored["dtype"]), count=rows,
+                                          offset=stored["offset"])
+            categories[column] = tuple(stored["categories"])
+        meta = {key: entry[key] for key in ("carrier", "pilot", "callsign", "player", "airframe", "number")}
+        return Pass(values, codes, categories, meta, entry["source"])
+
+    def passes(self, **filters) -> list:
+        """ Passes of the entries find(**filters) returns """
+        return [self.load(entry["source"]) for entry in self.find(**filters)]
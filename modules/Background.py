@@ -0,0 +1,372 @@
+import os
+
+import numpy
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from modules.Airframes import AirframeLimits
+from modules.Keys import KeysGRV as GRV, KeysGS as GS, KeysAoA as AoA
+from modules.Profiles import OutputProfile
+from modules.Utils import Utils
+
+
+class Background(object):
+    """ The static part of a case 1 trapsheet plot: axes, limit lines, fill-ins and distance marks.
+        Built once per airframe limits and fillins setting; passes only add their tracks on top.
+    """
+    # X-axis setup [cbls]
+    x_axis_limit_left = 15
+    x_axis_limit_right = 0
+
+    line_alpha = .3
+    fill_alpha = .05
+
+    def __init__(self, airframe: AirframeLimits, fillins: bool = False, figure: Figure = None):
+        self.figure = figure if figure is not None else Figure()
+        self.figure.set_size_inches(15, 25)
+        self.caption = self.figure.text(0.5, 0.05, "", horizontalalignment='center', verticalalignment='center',
+                                        color='red')
+        self.__fillins = fillins
+        self.__tight_bboxes = {}
+
+        self.groove, self.glideslope, self.aoa, self.utils = self.figure.subplots(4)
+        self.lue = self.__plotter_groove(airframe)
+        self.gse = self.__plotter_glideslope(airframe)
+        self.__plotter_aoa(airframe.aoa)
+        self.vy, self.roll = self.__plotter_utils()
+
+        self.figure.gca().set_xlim(self.x_axis_limit_left, self.x_axis_limit_right)
+
+    def tight_bbox(self, dpi: int):
+        """ Padded tight bounding box [inches] of the layout at a dpi. Tracks stay inside their axes, so it is
+            computed once for the cached background instead of by an extra draw in every bbox_inches='tight' savefig.
+        """
+        if dpi not in self.__tight_bboxes:
+            figure_dpi = self.figure.dpi
+            self.figure.dpi = dpi
+            try:
+                renderer = FigureCanvasAgg(self.figure).get_renderer()
+                self.__tight_bboxes[dpi] = self.figure.get_tightbbox(renderer).padded(.1)
+            finally:
+                self.figure.dpi = figure_dpi
+        return self.__tight_bboxes[dpi]
+
+    def save(self, file_name: str, profile: OutputProfile, reuse_bbox: bool = False) -> str:
+        path = profile.file_name(file_name)
+        size = self.figure.get_size_inches()
+        if profile.size:
+            self.figure.set_size_inches(*profile.size)
+        dpi = profile.dpi
+        try:
+            while True:
+                bbox = self.tight_bbox(dpi) if reuse_bbox and not profile.size else 'tight'
+                self.figure.savefig(path, bbox_inches=bbox, dpi=dpi, format=profile.format,
+                                    transparent=profile.transparent)
+                if not profile.max_bytes or os.path.getsize(path) <= profile.max_bytes or dpi <= 10:
+                    return path
+                dpi = int(dpi * .75)
+        finally:
+            if profile.size:
+                self.figure.set_size_inches(*size)
+
+    @staticmethod
+    def limits_x_axis():
+        return numpy.linspace(Background.x_axis_limit_right, Background.x_axis_limit_left,
+                              Background.x_axis_limit_left)
+
+    @staticmethod
+    def __plot_distance_marks(axe):
+        axe.axvline(x=Utils.mile_quarts(1, mtrs=False, cbls=True), color='black', alpha=.15, linestyle='--',
+                    linewidth=1, label="1/4 Nm")
+        axe.axvline(x=Utils.mile_quarts(2, mtrs=False, cbls=True), color='black', alpha=.15, linestyle='--',
+                    linewidth=1, label="1/2 Nm'")
+        axe.axvline(x=Utils.mile_quarts(3, mtrs=False, cbls=True), color='red', alpha=.75, linestyle='--',
+                    linewidth=1, label="3/4 Nm'")
+        axe.axvline(x=Utils.mile_quarts(4, mtrs=False, cbls=True), color='black', alpha=.15, linestyle='--',
+                    linewidth=1, label="1 Nm'")
+
+    def __plotter_groove(self, airframe: AirframeLimits):
+        ax_grv = self.groove
+        fillins = self.__fillins
+        line_alpha = self.line_alpha
+        fill_alpha = self.fill_alpha
+        grv_limits_data = airframe.grv
+        envelope_x, envelope = airframe.groove_envelope()
+
+        grv___lul___limit = grv_limits_data[GRV.___lul___()]
+        grv__lul__limit = grv_limits_data[GRV.__lul__()]
+        grv_lul_limit = grv_limits_data[GRV.lul()]
+        grv_lur_limit = grv_limits_data[GRV.lur()]
+        grv__lur__limit = grv_limits_data[GRV.__lur__()]
+        grv___lur___limit = grv_limits_data[GRV.___lur___()]
+
+        grv_y_axis_limit_low = 2.5
+        grv_y_axis_limit_hi = -.2
+
+        def plotter_lue():
+            axins_grv = ax_grv.inset_axes([.6, 0, .4, .4], transform=None, alpha=0.5, clip_path=None)
+            x1, x2, y1, y2 = 6, 0, -4, 4
+            axins_grv.set_xlim(x1, x2)
+            axins_grv.set_ylim(y1, y2)
+            axins_grv.text(.5, .9, "LUE [deg/cbls]", horizontalalignment='center',
+                           transform=axins_grv.transAxes)
+
+            def lue_plot_limits(limit, colour, label):
+                axins_grv.plot(
+                    numpy.linspace(limit, limit),
+                    color=colour, alpha=line_alpha, linestyle='--', linewidth=1, label=label)
+
+            def lue_fill_limits(limit_1, limit_2, colour):
+                axins_grv.fill_between(
+                    numpy.linspace(x1, x2, x1),
+                    numpy.linspace(limit_1, limit_1, x1),
+                    numpy.linspace(limit_2, limit_2, x1),
+                    color=colour, alpha=fill_alpha)
+
+            lue_plot_limits(grv___lul___limit, 'red', '__LUL__')
+            lue_plot_limits(grv__lul__limit, 'orange', 'LUL')
+            lue_plot_limits(grv_lul_limit, 'green', '(LUL)')
+            lue_plot_limits(grv_lur_limit, 'green', '(LUR)')
+            lue_plot_limits(grv__lur__limit, 'orange', 'LUR')
+            lue_plot_limits(grv___lur___limit, 'red', '__LUL__')
+
+            if fillins:
+                lue_fill_limits(grv___lul___limit, grv__lul__limit, 'red')
+                lue_fill_limits(grv__lul__limit, grv_lul_limit, 'orange')
+                lue_fill_limits(grv_lul_limit, grv_lur_limit, 'green')
+                lue_fill_limits(grv_lur_limit, grv__lur__limit, 'orange')
+                lue_fill_limits(grv__lur__limit, grv___lur___limit, 'red')
+
+            axins_grv.yaxis.tick_right()
+            axins_grv.xaxis.tick_top()
+            axins_grv.invert_yaxis()
+            axins_grv.patch.set_alpha(0)
+            axins_grv.grid(False)
+            return axins_grv
+
+        def grv_plot_limits(limit, colour, label):
+            ax_grv.plot(envelope_x, envelope[limit], color=colour, alpha=line_alpha, linestyle='--', linewidth=1,
+                        label=label)
+
+        def grv_fill_limits(limit_1, limit_2, colour):
+            ax_grv.fill_between(envelope_x, envelope[limit_1], envelope[limit_2], color=colour, alpha=fill_alpha)
+
+        ax_grv.set_ylim(grv_y_axis_limit_low, grv_y_axis_limit_hi)
+        ax_grv.set_ylabel('lateral offset [Cbls]')
+        ax_grv.set_xlabel("distance [Cbls]")
+        ax_grv.set_xlim(self.x_axis_limit_right, self.x_axis_limit_left)
+
+        grv_plot_limits(GRV.___lul___(), 'red', '__LUL__')
+        grv_plot_limits(GRV.__lul__(), 'orange', 'LUL')
+        grv_plot_limits(GRV.lul(), 'green', '(LUL)')
+        # grv_plot_limits(GRV.ok(), 'black', '__OK__')
+        grv_plot_limits(GRV.lur(), 'green', '(LUR)')
+        grv_plot_limits(GRV.__lur__(), 'orange', 'LUR')
+        grv_plot_limits(GRV.___lur___(), 'red', '__LUR__')
+
+        if fillins:
+            grv_fill_limits(GRV.lul(), GRV.lur(), 'green')
+            grv_fill_limits(GRV.lul(), GRV.__lul__(), 'orange')
+            grv_fill_limits(GRV.lur(), GRV.__lur__(), 'orange')
+            grv_fill_limits(GRV.__lul__(), GRV.___lul___(), 'red')
+            grv_fill_limits(GRV.__lur__(), GRV.___lur___(), 'red')
+
+        self.__plot_distance_marks(ax_grv)
+        ax_grv.invert_xaxis()
+        ax_grv.grid(False)
+        return plotter_lue()
+
+    def __plotter_glideslope(self, airframe: AirframeLimits):
+        ax_gs = self.glideslope
+        fillins = self.__fillins
+        line_alpha = self.line_alpha
+        fill_alpha = self.fill_alpha
+        gse_limits_data = airframe.gse
+        envelope_x, envelope = airframe.glideslope_envelope()
+
+        gse___hi___limit = gse_limits_data[GS.___hi___()]
+        gse__hi__limit = gse_limits_data[GS.__hi__()]
+        gse_hi_limit = gse_limits_data[GS.hi()]
+        gse_lo_limit = gse_limits_data[GS.lo()]
+        gse__lo__limit = gse_limits_data[GS.__lo__()]
+        gse___lo___limit = gse_limits_data[GS.___lo___()]
+
+        gs_y_axis_limit_low = 0
+        gs_y_axis_limit_hi = 850
+
+        def plotter_gse():
+            axins_gs = ax_gs.inset_axes([.6, .6, .4, .4], transform=None, alpha=0.5, clip_path=None)
+            x1, x2, y1, y2 = 6, 0, gse___lo___limit - .5, gse___hi___limit + .5
+            axins_gs.set_xlim(x1, x2)
+            axins_gs.set_ylim(y1, y2)
+            axins_gs.text(.5, .9, "GSE [deg/cbls]", horizontalalignment='center',
+                          transform=axins_gs.transAxes)
+
+            def gse_plot_limits(limit, colour, label):
+                axins_gs.plot(
+                    numpy.linspace(limit, limit),
+                    color=colour, alpha=line_alpha, linestyle='--', linewidth=1, label=label)
+
+            def gse_fill_limits(limit_1, limit_2, colour):
+                axins_gs.fill_between(
+                    numpy.linspace(x1, x2, x1),
+                    numpy.linspace(limit_1, limit_1, x1),
+                    numpy.linspace(limit_2, limit_2, x1),
+                    color=colour, alpha=fill_alpha)
+
+            gse_plot_limits(gse___hi___limit, 'red', '__HI__')
+            gse_plot_limits(gse__hi__limit, 'orange', 'H')
+            gse_plot_limits(gse_hi_limit, 'green', '(H)')
+            gse_plot_limits(gse_lo_limit, 'green', '(L)')
+            gse_plot_limits(gse__lo__limit, 'orange', 'L')
+            gse_plot_limits(gse___lo___limit, 'red', '__L__')
+
+            if fillins:
+                gse_fill_limits(gse___hi___limit, gse__hi__limit, 'red')
+                gse_fill_limits(gse__hi__limit, gse_hi_limit, 'orange')
+                gse_fill_limits(gse_hi_limit, gse_lo_limit, 'green')
+                gse_fill_limits(gse_lo_limit, gse__lo__limit, 'orange')
+                gse_fill_limits(gse__lo__limit, gse___lo___limit, 'red')
+
+            axins_gs.patch.set_alpha(0)
+            axins_gs.yaxis.tick_right()
+            axins_gs.grid(False)
+            return axins_gs
+
+        def gs_plot_limits(limit, colour, label):
+            ax_gs.plot(envelope_x, envelope[limit], color=colour, alpha=line_alpha, linestyle='--', linewidth=1,
+                       label=label)
+
+        def gs_fill_limits(limit_1, limit_2, colour):
+            ax_gs.fill_between(envelope_x, envelope[limit_1], envelope[limit_2], color=colour, alpha=fill_alpha)
+
+        ax_gs.set_ylim(gs_y_axis_limit_low, gs_y_axis_limit_hi)
+        ax_gs.set_xlim(self.x_axis_limit_right, self.x_axis_limit_left)
+        ax_gs.set_ylabel('height [feet]')
+        ax_gs.set_xlabel("distance [Cbls]")
+
+        gs_plot_limits(GS.___hi___(), 'red', '__HI__')
+        gs_plot_limits(GS.__hi__(), 'orange', 'H')
+        gs_plot_limits(GS.hi(), 'green', '(H)')
+        # gs_plot_limits(GS.gs(), 'black', '__OK__')
+        gs_plot_limits(GS.lo(), 'green', '(LO)')
+        gs_plot_limits(GS.__lo__(), 'orange', 'LO')
+        gs_plot_limits(GS.___lo___(), 'red', '__LO__')
+
+        if fillins:
+            gs_fill_limits(GS.lo(), GS.hi(), 'green')
+            gs_fill_limits(GS.lo(), GS.__lo__(), 'orange')
+            gs_fill_limits(GS.hi(), GS.__hi__(), 'orange')
+            gs_fill_limits(GS.__lo__(), GS.___lo___(), 'red')
+            gs_fill_limits(GS.__hi__(), GS.___hi___(), 'red')
+
+        self.__plot_distance_marks(ax_gs)
+        ax_gs.invert_xaxis()
+        ax_gs.grid(False)
+        return plotter_gse()
+
+    def __plotter_aoa(self, aoa_limits_data: dict):
+        ax_aoa = self.aoa
+        fillins = self.__fillins
+        line_alpha = self.line_alpha
+        limits_x_axis = self.limits_x_axis()
+        x_axis_limit_left = self.x_axis_limit_left
+
+        aoa_slo_hi_limit = aoa_limits_data[AoA.slo_hi()]
+        aoa_slo_med_limit = aoa_limits_data[AoA.slo_med()]
+        aoa_slo_lo_limit = aoa_limits_data[AoA.slo_lo()]
+        aoa_fst_lo_limit = aoa_limits_data[AoA.fast_lo()]
+        aoa_fst_med_limit = aoa_limits_data[AoA.fast_med()]
+        aoa_fst_hi_limit = aoa_limits_data[AoA.fast_hi()]
+
+        aoa_y_axis_limit_low = aoa_limits_data[AoA.fast_hi()] - .5
+        aoa_y_axis_limit_hi = aoa_limits_data[AoA.slo_hi()] + .5
+        ax_aoa.set_ylim(aoa_y_axis_limit_low, aoa_y_axis_limit_hi)
+        ax_aoa.set_xlim(self.x_axis_limit_right, x_axis_limit_left)
+        ax_aoa.set_ylabel('AoA [deg]')
+        ax_aoa.set_xlabel("distance [Cbls]")
+
+        def aoa_plot_limits(limit, colour, label):
+            ax_aoa.plot(
+                numpy.linspace(limit, limit, x_axis_limit_left),
+                color=colour, alpha=line_alpha, linestyle='--', linewidth=1, label=label)
+
+        def aoa_fill_limits(limit_1, limit_2, colour):
+            ax_aoa.fill_between(
+                limits_x_axis,
+                numpy.linspace(limit_1, limit_1, x_axis_limit_left),
+                numpy.linspace(limit_2, limit_2, x_axis_limit_left),
+                color=colour, alpha=.03)
+
+        aoa_plot_limits(aoa_slo_hi_limit, 'red', "__SLO__")
+        aoa_plot_limits(aoa_slo_med_limit, 'orange', "SLO")
+        aoa_plot_limits(aoa_slo_lo_limit, 'green', "(SLO)")
+        # aoa_plot_limits(aoa_ok_limit, 'black', "__OK__")
+        aoa_plot_limits(aoa_fst_lo_limit, 'green', "(F)")
+        aoa_plot_limits(aoa_fst_med_limit, 'orange', "F")
+        aoa_plot_limits(aoa_fst_hi_limit, 'red', "__F__")
+
+        if fillins:
+            aoa_fill_limits(aoa_slo_hi_limit, aoa_slo_med_limit, 'red')
+            aoa_fill_limits(aoa_slo_med_limit, aoa_slo_lo_limit, 'orange')
+            aoa_fill_limits(aoa_slo_lo_limit, aoa_fst_lo_limit, 'green')
+            aoa_fill_limits(aoa_fst_lo_limit, aoa_fst_med_limit, 'orange')
+            aoa_fill_limits(aoa_fst_med_limit, aoa_fst_hi_limit, 'red')
+
+        self.__plot_distance_marks(ax_aoa)
+        ax_aoa.invert_xaxis()
+        ax_aoa.grid(False)
+
+    def __plotter_utils(self):
+        utils = self.utils
+        line_alpha = self.line_alpha
+        fill_alpha = self.fill_alpha
+
+        utils.set_xticks([], [])
+        utils.set_yticks([], [])
+
+        utils_y_axis_limit_lo = 0
+        utils_y_axis_limit_hi = 1
+        utils.set_ylim(utils_y_axis_limit_lo, utils_y_axis_limit_hi)
+
+        axins_vy = utils.inset_axes([0, 0, .5, 1], transform=None, alpha=0.5, clip_path=None)
+        axins_roll = utils.inset_axes([.5, 0, .5, 1], transform=None, alpha=0.5, clip_path=None)
+        vyx1, vyx2, vyy1, vyy2 = 6, 0, -400, -1500
+        rx1, rx2, ry1, ry2 = 6, 0, 50, -50
+        axins_vy.set_xlim(vyx1, vyx2)
+        axins_vy.set_ylim(vyy1, vyy2)
+        axins_roll.set_xlim(rx1, rx2)
+        axins_roll.set_ylim(ry1, ry2)
+        axins_roll.yaxis.tick_right()
+        axins_vy.grid(False)
+        axins_roll.grid(False)
+        axins_roll.patch.set_alpha(0)
+        axins_vy.patch.set_alpha(0)
+        axins_vy.set_xticks([0, 1, 2, 3, 4, 5, 6], [0, 1, 2, 3, 4, 5, 6])
+        axins_roll.set_xticks([0, 1, 2, 3, 4, 5], [0, 1, 2, 3, 4, 5])
+        axins_vy.set_ylabel('Vertical spd [ft/min]')
+        axins_vy.set_xlabel("distance [Cbls]")
+        axins_roll.set_ylabel('Bank Angle [deg]')
+        axins_roll.yaxis.set_label_position("right")
+        axins_roll.set_xlabel("distance [Cbls]")
+
+        def plot_lin_limits(limit, colour, label, axin):
+            axin.plot(
+                numpy.linspace(limit, limit),
+                color=colour, alpha=line_alpha, linestyle='--', linewidth=1, label=label)
+
+        def fill_lin_limits(limit_1, limit_2, colour, axin):
+            axin.fill_between(
+                numpy.linspace(vyx1, vyx2, vyx1),
+                numpy.linspace(limit_1, limit_1, vyx1),
+                numpy.linspace(limit_2, limit_2, vyx1),
+                color=colour, alpha=fill_alpha)
+
+        plot_lin_limits(-900, 'red', 'Vy limit', axins_vy)
+        fill_lin_limits(-900, vyy2, 'red', axins_vy)
+        axins_vy.text(.5, .75, "EXTENDED LANDING GEAR INSPECTION", horizontalalignment='center',
+                      transform=axins_vy.transAxes)
+
+        plot_lin_limits(-2.5, 'green', 'roll limit', axins_roll)
+        plot_lin_limits(2.5, 'green', 'roll limit', axins_roll)
+        return axins_vy, axins_roll
@@ -0,0 +1,144 @@
+import csv
+import fnmatch
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from modules.Metrics import Metrics
+from modules.Utils import Bcolors
+
+
+class BatchResult(object):
+    def __init__(self, file_path: str, seconds: float, outputs: list = None, error: str = None,
+                 metrics: list = None):
+        self.file_path = file_path
+        self.seconds = seconds
+        self.outputs = outputs or []
+        self.error = error
+        # observations drained from the render worker, replayed by the parent process
+        self.metrics = metrics
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BatchReport(object):
+    def __init__(self, results: list, wall_seconds: float, workers: int):
+        self.results = sorted(results, key=lambda r: r.file_path)
+        self.wall_seconds = wall_seconds
+        self.workers = workers
+
+    @property
+    def failures(self) -> list:
+        return [r for r in self.results if not r.ok]
+
+    def write(self, file_path: str):
+        with open(file_path, "w", newline="") as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(["file", "seconds", "status", "outputs", "error"])
+            for r in self.results:
+                writer.writerow([r.file_path, "%.3f" % r.seconds, "ok" if r.ok else "failed",
+                                 ";".join(r.outputs), r.error or ""])
+
+    def __str__(self):
+        lines = []
+        for r in self.results:
+            if r.ok:
+                lines.append(Bcolors.OKGREEN + "OK    " + Bcolors.ENDC + "%7.2fs  %s" % (r.seconds, r.file_path))
+            else:
+                lines.append(Bcolors.FAIL + "FAIL  " + Bcolors.ENDC + "%7.2fs  %s: %s" % (
+                    r.seconds, r.file_path, r.error.strip().splitlines()[-1]))
+        rendered = sum(r.seconds for r in self.results)
+        lines.append(Bcolors.BOLD + "%d files, %d failed, %.2fs wall, %.2fs rendering, %d workers" % (
+            len(self.results), len(self.failures), self.wall_seconds, rendered, self.workers) + Bcolors.ENDC)
+        return "\n".join(lines)
+
+
+def init_render_worker(metrics: bool = False):
+    import matplotlib
+    matplotlib.use("Agg")
+    if metrics:
+        Metrics.enable(buffer=True)
+
+
+def render_trapsheet(file_path: str, out_dir: str, cache_dir: str = None, profiles: list = None,
+                     decimate: int = None) -> BatchResult:
+    from modules.Plotter import Plotter
+    from modules.TrapsheetCache import TrapsheetCache
+
+    start = time.perf_counter()
+    try:
+        file_name = os.path.join(out_dir, os.path.splitext(os.path.basename(file_path))[0])
+        cache = TrapsheetCache(cache_dir) if cache_dir else None
+        plotter = Plotter(file_path, cache=cache, decimate=decimate)
+        outputs = plotter.plot_case1(file_name=file_name, show=False, profiles=profiles)
+        Metrics.count("airboss_renders_total")
+        return BatchResult(file_path, time.perf_counter() - start, outputs, metrics=Metrics.drain())
+    except Exception:
+        Metrics.count("airboss_render_failures_total")
+        return BatchResult(file_path, time.perf_counter() - start, error=traceback.format_exc(),
+                           metrics=Metrics.drain())
+
+
+class Batch(object):
+    """ Renders trapsheets in a process pool. Every run() starts and stops a pool of its own, unless the batch is
+        used as a context manager: then one pool (its workers with matplotlib already imported) serves every run()
+        until exit, as the watcher needs.
+    """
+    TRAPSHEET_PATTERN = "AIRBOSS-*_Trapsheet-*.csv"
+
+    def __init__(self, work_dir: str, out_dir: str = None, workers: int = None, cache_dir: str = None,
+                 profiles: list = None, decimate: int = None):
+        self.__work_dir = work_dir
+        self.__out_dir = out_dir or work_dir
+        self.__workers = workers or os.cpu_count() or 1
+        self.__cache_dir = cache_dir
+        self.__profiles = profiles
+        self.__decimate = decimate
+        self.__pool = None
+
+    def __new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.__workers, initializer=init_render_worker,
+                                   initargs=(Metrics.enabled(),))
+
+    def __enter__(self) -> "Batch":
+        self.__pool = self.__new_pool()
+        return self
+
+    def __exit__(self, *exc):
+        self.__pool.shutdown()
+        self.__pool = None
+
+    def trapsheets(self) -> list:
+        return sorted(os.path.join(self.__work_dir, f) for f in os.listdir(self.__work_dir)
+                      if fnmatch.fnmatch(f, self.TRAPSHEET_PATTERN))
+
+    def run(self, files: list = None) -> BatchReport:
+        files = self.trapsheets() if files is None else files
+        os.makedirs(self.__out_dir, exist_ok=True)
+        start = time.perf_counter()
+        results = []
+        pool = self.__pool or self.__new_pool()
+        broken = False
+        try:
+            futures = {pool.submit(render_trapsheet, f, self.__out_dir, self.__cache_dir, self.__profiles,
+                                   self.__decimate): f for f in files}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                    Metrics.replay(results[-1].metrics)
+                except Exception as e:
+                    # worker process died (e.g. killed by the OOM killer), not a Python error in the render
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    results.append(BatchResult(futures[future], 0., error=traceback.format_exc()))
+        finally:
+            if pool is not self.__pool:
+                pool.shutdown()
+            elif broken:
+                # a broken pool takes no more work, the next run() gets a new one
+                pool.shutdown()
+                self.__pool = self.__new_pool()
+        return BatchReport(results, time.perf_counter() - start, self.__workers)
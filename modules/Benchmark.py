@@ -0,0 +1,214 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.Airframes import Airframes
+from modules.Background import Background
+from modules.Batch import Batch
+from modules.Groove import Groove
+from modules.Keys import KeysCSV as K
+from modules.Pass import Pass
+from modules.Profiles import Profiles
+from modules.Track import Track
+from modules.Trapsheet import Trapsheet
+from modules.Utils import Bcolors
+
+
+class BenchmarkCase(object):
+    def __init__(self, name: str, file_path: str):
+        self.name = name
+        self.file_path = file_path
+
+
+class Benchmark(object):
+    """ Times the stages of rendering a pass separately: csv load, downwind stripping, interpolation, background
+        figure build and savefig (tracks drawn and the image written). Every stage runs `repeat` times and reports the
+        median; the peak traced memory [KiB] of each stage comes from one extra run under tracemalloc, so tracing does
+        not slow down the timed runs. Results compare against a saved baseline to flag regressions.
+    """
+    STAGES = ["load", "segment", "interpolate", "figure", "savefig"]
+    # changes below this many seconds are timer noise, never regressions
+    MIN_DELTA = .005
+    # what a command that does not render imports, and the libraries it must not load
+    STARTUP_IMPORTS = ["main", "modules.Bot", "modules.Grades", "modules.Watcher"]
+    HEAVY_MODULES = ["matplotlib", "scipy", "pandas", "numpy"]
+
+    def __init__(self, cases: list, repeat: int = 3, profile: str = Profiles.PRINT.name):
+        self.cases = cases
+        self.repeat = repeat
+        self.profile = Profiles.get([profile])[0]
+
+    @staticmethod
+    def rows(file_path: str) -> int:
+        with open(file_path, "rb") as data_file:
+            return sum(1 for _ in data_file) - 1
+
+    @staticmethod
+    def synthetic(file_path: str, scale: int, out_dir: str) -> str:
+        """ Copy of a pass sampled `scale` times as densely, written under out_dir/x<scale>/ with the same name """
+        data = Trapsheet.load(file_path)
+        time_column = data[K.time()].to_numpy()
+        times = np.linspace(time_column[0], time_column[-1], len(data) * scale)
+        nearest = np.clip(np.searchsorted(time_column, times), 0, len(data) - 1)
+        columns = []
+        for column in Trapsheet.columns():
+            if column in Trapsheet.text_columns():
+                columns.append(data[column].to_numpy()[nearest])
+            elif column == K.points():
+                points = data[column].to_numpy()[nearest]
+                columns.append(np.where(np.isnan(points), "n/a", np.char.mod("%.1f", points)))
+            else:
+                columns.append(np.char.mod("%.3f", np.interp(times, time_column, data[column].to_numpy())))
+        path = os.path.join(out_dir, "x%d" % scale, os.path.basename(file_path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as data_file:
+            data_file.write("#" + ",".join(Trapsheet.columns()) + "\n")
+            data_file.writelines(",".join(row) + "\n" for row in zip(*columns))
+        return path
+
+    @staticmethod
+    def cases_for(work_dir: str, scales: list = None, out_dir: str = None) -> list:
+        """ The shortest and the longest trapsheet in work_dir plus the longest scaled up by each of `scales` """
+        files = sorted(Batch(work_dir).trapsheets(), key=Benchmark.rows)
+        if not files:
+            raise ValueError("no trapsheets in %s" % work_dir)
+        cases = [BenchmarkCase("short", files[0]), BenchmarkCase("long", files[-1])]
+        for scale in scales or []:
+            cases.append(BenchmarkCase("long-x%d" % scale, Benchmark.synthetic(files[-1], scale, out_dir)))
+        return cases
+
+    @staticmethod
+    def startup(repeat: int = 3) -> dict:
+        """ Import time of the CLI and the bot in a fresh interpreter (median of `repeat`), and the heavy libraries
+            those imports loaded, which should be none
+        """
+        code = ("import sys, time\n"
+                "start = time.perf_counter()\n"
+                "import %s\n"
+                "print(time.perf_counter() - start)\n"
+                "print(','.join(m for m in %r if m in sys.modules))\n") % (", ".join(Benchmark.STARTUP_IMPORTS),
+                                                                          Benchmark.HEAVY_MODULES)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        seconds, heavy = [], []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True,
+                                    check=True).stdout.splitlines()
+            seconds.append(float(output[0]))
+            heavy = [m for m in output[1].split(",") if m] if len(output) > 1 else []
+        return {"rows": 0, "heavy": heavy,
+                "stages": {"import": {"seconds": statistics.median(seconds), "peak_kib": 0.}}}
+
+    def __stages(self, file_path: str, out_dir: str):
+        """ Stage name -> callable, each one feeding the next """
+        state = {}
+        file_name = os.path.join(out_dir, "bench")
+
+        def load():
+            state["data"] = Pass.load(file_path)
+
+        def segment():
+            state["groove"] = Groove.groove_slice(state["data"][K.x()])
+
+        def interpolate():
+            state["track"] = Track(state["data"].rows(state["groove"]))
+
+        def figure():
+            state["background"] = Background(Airframes.for_file(file_path))
+
+        def savefig():
+            background, track = state["background"], state["track"]
+            for ax, column in ((background.groove, K.z()), (background.lue, K.lue()),
+                               (background.glideslope, K.alt()), (background.gse, K.gse()),
+                               (background.aoa, K.aoa()), (background.vy, K.vy()), (background.roll, K.roll())):
+                ax.plot(track.distance, track[column], linewidth=.75, color='black')
+            background.save(file_name, self.profile, reuse_bbox=True)
+
+        return [("load", load), ("segment", segment), ("interpolate", interpolate), ("figure", figure),
+                ("savefig", savefig)]
+
+    def run(self) -> dict:
+        """ case -> stage -> {"seconds", "peak_kib"}, plus the rows of each case. The 'startup' case is the import
+            time of the non-render code paths.
+        """
+        results = {"startup": self.startup(self.repeat)}
+        with tempfile.TemporaryDirectory() as out_dir:
+            for case in self.cases:
+                seconds = {stage: [] for stage in self.STAGES}
+                for _ in range(self.repeat):
+                    for stage, call in self.__stages(case.file_path, out_dir):
+                        start = time.perf_counter()
+                        call()
+                        seconds[stage].append(time.perf_counter() - start)
+                peaks = {}
+                for stage, call in self.__stages(case.file_path, out_dir):
+                    tracemalloc.start()
+                    try:
+                        call()
+                        peaks[stage] = tracemalloc.get_traced_memory()[1] / 1024
+                    finally:
+                        tracemalloc.stop()
+                results[case.name] = {"rows": self.rows(case.file_path), "stages": {
+                    stage: {"seconds": statistics.median(seconds[stage]), "peak_kib": round(peaks[stage], 1)}
+                    for stage in self.STAGES}}
+        return results
+
+    @staticmethod
+    def save(results: dict, file_path: str):
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path + ".tmp", "w") as baseline_file:
+            json.dump(results, baseline_file, indent=1)
+        os.replace(file_path + ".tmp", file_path)
+
+    @staticmethod
+    def load(file_path: str) -> dict:
+        with open(file_path, "r") as baseline_file:
+            return json.load(baseline_file)
+
+    @staticmethod
+    def regressions(results: dict, baseline: dict, threshold: float = .25) -> list:
+        """ (case, stage, metric, baseline, current) of every stage more than `threshold` slower or bigger than in
+            the baseline. Cases or stages missing from the baseline are skipped. A startup that loads any heavy
+            library is always a regression.
+        """
+        found = []
+        for case, result in results.items():
+            if result.get("heavy"):
+                found.append((case, "import", ",".join(result["heavy"]), 0, len(result["heavy"])))
+            for stage, current in result["stages"].items():
+                before = baseline.get(case, {}).get("stages", {}).get(stage)
+                if before is None:
+                    continue
+                if current["seconds"] > before["seconds"] * (1 + threshold) and \
+                        current["seconds"] - before["seconds"] > Benchmark.MIN_DELTA:
+                    found.append((case, stage, "seconds", before["seconds"], current["seconds"]))
+                if current["peak_kib"] > before["peak_kib"] * (1 + threshold):
+                    found.append((case, stage, "peak_kib", before["peak_kib"], current["peak_kib"]))
+        return found
+
+    @staticmethod
+    def report(results: dict, baseline: dict = None, regressions: list = None) -> str:
+        lines = ["%-12s %7s  %-12s %10s %10s %12s" % ("case", "rows", "stage", "seconds", "baseline", "peak KiB")]
+        flagged = {(case, stage) for case, stage, _, _, _ in regressions or []}
+        for case, result in results.items():
+            for stage, current in result["stages"].items():
+                before = (baseline or {}).get(case, {}).get("stages", {}).get(stage)
+                line = "%-12s %7d  %-12s %10.4f %10s %12.1f" % (
+                    case, result["rows"], stage, current["seconds"],
+                    "%.4f" % before["seconds"] if before else "-", current["peak_kib"])
+                lines.append(Bcolors.FAIL + line + Bcolors.ENDC if (case, stage) in flagged else line)
+        for case, stage, metric, before, current in regressions or []:
+            if metric not in ("seconds", "peak_kib"):
+                lines.append(Bcolors.FAIL + "REGRESSION  %s %s loads %s" % (case, stage, metric) + Bcolors.ENDC)
+                continue
+            lines.append(Bcolors.FAIL + "REGRESSION  %s %s %s: %.4g -> %.4g (%+.0f%%)" % (
+                case, stage, metric, before, current, (current / before - 1) * 100 if before else 0) + Bcolors.ENDC)
+        return "\n".join(lines)
@@ -0,0 +1,327 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules.Airframes import Airframes
+from modules.Batch import Batch, BatchResult, init_render_worker, render_trapsheet
+from modules.Grades import GradesStore
+from modules.ImageCache import ImageCache
+from modules.Metrics import Metrics
+from modules.Profiles import Profiles
+from modules.Trapsheet import Trapsheet
+from modules.Utils import Bcolors
+
+
+class Message(object):
+    def __init__(self, channel: str, author: str, content: str, raw=None):
+        self.channel = channel
+        self.author = author
+        self.content = content
+        # the gateway's own message object, if any
+        self.raw = raw
+
+
+class FakeGateway(object):
+    """ Offline stand-in for the Discord gateway: the caller posts messages, replies are collected in `replies` """
+
+    def __init__(self):
+        self.__inbox = asyncio.Queue()
+        self.replies = asyncio.Queue()
+
+    def post(self, content: str, channel: str = "test", author: str = "tester") -> Message:
+        message = Message(channel, author, content)
+        self.__inbox.put_nowait(message)
+        return message
+
+    def close(self):
+        self.__inbox.put_nowait(None)
+
+    async def messages(self):
+        while True:
+            message = await self.__inbox.get()
+            if message is None:
+                return
+            yield message
+
+    async def reply(self, message: Message, content: str, files: list = None):
+        await self.replies.put((message, content, files or []))
+
+
+class DiscordGateway(object):
+    """ discord.py client behind the same interface as FakeGateway. discord.py is only needed when this is used. """
+
+    def __init__(self, token: str):
+        import discord
+
+        self.__discord = discord
+        self.__token = token
+        self.__inbox = asyncio.Queue()
+        intents = discord.Intents.default()
+        intents.message_content = True
+        self.__client = discord.Client(intents=intents)
+
+        @self.__client.event
+        async def on_message(raw):
+            if raw.author != self.__client.user:
+                await self.__inbox.put(Message(str(raw.channel.id), str(raw.author), raw.content, raw))
+
+    async def messages(self):
+        """ Messages as they arrive. Ends when the client stops, raising its error (a bad token, a lost connection)
+            instead of waiting on the inbox forever.
+        """
+        client = asyncio.create_task(self.__client.start(self.__token))
+        try:
+            while True:
+                message = asyncio.create_task(self.__inbox.get())
+                await asyncio.wait({message, client}, return_when=asyncio.FIRST_COMPLETED)
+                if message.done():
+                    yield message.result()
+                    continue
+                message.cancel()
+                client.result()
+                return
+        finally:
+            await self.__client.close()
+            await asyncio.gather(client, return_exceptions=True)
+
+    async def reply(self, message: Message, content: str, files: list = None):
+        await message.raw.channel.send(content, files=[self.__discord.File(f) for f in files or []])
+
+
+class Busy(Exception):
+    pass
+
+
+class RenderJob(object):
+    def __init__(self, file_path: str, key: str = None):
+        self.file_path = file_path
+        # renders of the same key share this job
+        self.key = key or file_path
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.result: BatchResult = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def queued(self) -> float:
+        return (self.started or time.perf_counter()) - self.submitted
+
+
+class RenderQueue(object):
+    """ Bounded queue of render jobs in front of a process pool. `workers` jobs render at a time, up to `depth` more
+        wait; beyond that submit() raises Busy instead of letting the backlog grow. A render asked for while the same
+        one is queued or running joins that job instead of queueing another. Every job renders into a directory of
+        its own and its images are renamed into out_dir once complete, so a reader never sees a partial file.
+    """
+
+    def __init__(self, out_dir: str, workers: int = None, depth: int = 16, cache_dir: str = None,
+                 profile: str = Profiles.DISCORD_PREVIEW.name):
+        self.__out_dir = out_dir
+        self.__cache_dir = cache_dir
+        self.profile = Profiles.get([profile])[0]
+        self.__workers = workers or os.cpu_count() or 1
+        self.__queue = asyncio.Queue(maxsize=depth)
+        self.__pool = None
+        self.__tasks = []
+        self.__in_flight = {}
+
+    @property
+    def out_dir(self) -> str:
+        return self.__out_dir
+
+    @property
+    def depth(self) -> int:
+        return self.__queue.qsize()
+
+    def start(self):
+        os.makedirs(self.__out_dir, exist_ok=True)
+        self.__pool = ProcessPoolExecutor(max_workers=self.__workers, initializer=init_render_worker,
+                                          initargs=(Metrics.enabled(),))
+        self.__tasks = [asyncio.create_task(self.__worker()) for _ in range(self.__workers)]
+
+    async def close(self):
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, file_path: str, key: str = None) -> RenderJob:
+        """ key: identifies the render (e.g. its ImageCache key), the file path when not given """
+        job = self.__in_flight.get(key or file_path)
+        if job is not None:
+            Metrics.count("airboss_render_joined_total")
+            return job
+        job = RenderJob(file_path, key)
+        try:
+            self.__queue.put_nowait(job)
+        except asyncio.QueueFull:
+            Metrics.count("airboss_render_rejected_total")
+            raise Busy("%d renders already queued" % self.__queue.qsize())
+        self.__in_flight[job.key] = job
+        return job
+
+    def __publish(self, output: str) -> str:
+        published = os.path.join(self.__out_dir, os.path.basename(output))
+        os.replace(output, published)
+        return published
+
+    async def __worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.__queue.get()
+            job.started = time.perf_counter()
+            Metrics.observe("airboss_queue_wait_seconds", job.queued)
+            job_dir = tempfile.mkdtemp(prefix=".render-", dir=self.__out_dir)
+            try:
+                job.result = await loop.run_in_executor(self.__pool, render_trapsheet, job.file_path, job_dir,
+                                                        self.__cache_dir, [self.profile.name])
+                job.result.outputs = [self.__publish(output) for output in job.result.outputs]
+                Metrics.replay(job.result.metrics)
+                Metrics.observe("airboss_render_seconds", time.perf_counter() - job.started)
+                job.done.set_result(job.result)
+            except Exception as e:
+                job.done.set_exception(e)
+            finally:
+                self.__in_flight.pop(job.key, None)
+                shutil.rmtree(job_dir, ignore_errors=True)
+                self.__queue.task_done()
+                Metrics.flush()
+
+
+class AirbossBot(object):
+    """ Chat front end. Commands:
+            !trap <trapsheet file> | !trap <pilot> [pass]   render a pass
+            !card <trapsheet file> | !card <pilot> [pass]   small summary card of a pass
+            !grades <pilot>                                  last LSO grades of a pilot
+        Every message is handled in a task of its own, so a slow command never holds up the ones after it.
+        Renders run in the RenderQueue, the event loop only parses commands and sends replies. Everything else that
+        blocks runs in threads: trapsheet lookups, image cache keys (a hash of the whole file) and cards in the
+        default executor, grades queries in a thread of their own as they share one SQLite connection.
+    """
+    PREFIX = "!"
+
+    def __init__(self, gateway, renderer: RenderQueue, work_dir: str, grades: GradesStore = None,
+                 images: ImageCache = None):
+        self.__gateway = gateway
+        self.__renderer = renderer
+        self.__work_dir = work_dir
+        self.__grades = grades
+        self.__images = images
+        # handlers and deliveries still running
+        self.__tasks = set()
+        self.__queries = ThreadPoolExecutor(max_workers=1, thread_name_prefix="airboss-grades")
+
+    async def run(self):
+        self.__renderer.start()
+        try:
+            async for message in self.__gateway.messages():
+                self.__spawn(self.handle(message))
+            # handlers still running may start deliveries
+            while self.__tasks:
+                await asyncio.gather(*self.__tasks, return_exceptions=True)
+        finally:
+            await self.__renderer.close()
+            self.__queries.shutdown(wait=False)
+
+    def __spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__done)
+
+    def __done(self, task: asyncio.Task):
+        self.__tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(Bcolors.FAIL + "FAIL  " + Bcolors.ENDC + "%r" % task.exception())
+
+    def find(self, argument: str):
+        """ Trapsheet for '<file name>' or '<pilot> [pass]' (latest pass when no number is given), None if unknown """
+        argument = argument.strip()
+        if not argument:
+            return None
+        trapsheets = Batch(self.__work_dir).trapsheets()
+        for file_path in trapsheets:
+            if os.path.basename(file_path) == argument:
+                return file_path
+        pilot, _, number = argument.rpartition(" ")
+        if not number.isdigit():
+            pilot, number = argument, None
+        candidates = []
+        for file_path in trapsheets:
+            meta = Trapsheet.metadata(file_path)
+            if pilot in (meta["pilot"], meta["callsign"], meta["player"]) and \
+                    (number is None or meta["number"] == int(number)):
+                candidates.append(file_path)
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    async def handle(self, message: Message):
+        if not message.content.startswith(self.PREFIX):
+            return
+        command, _, argument = message.content[len(self.PREFIX):].partition(" ")
+        loop = asyncio.get_running_loop()
+        if command == "trap":
+            file_path = await loop.run_in_executor(None, self.find, argument)
+            if file_path is None:
+                await self.__gateway.reply(message, "No trapsheet found for '%s'" % argument.strip())
+                return
+            key = None
+            if self.__images is not None:
+                key = await loop.run_in_executor(None, self.image_key, file_path)
+                cached = self.__images.get(key)
+                if cached is not None:
+                    await self.__gateway.reply(message, "%s (cached)" % os.path.basename(file_path), files=[cached])
+                    return
+            try:
+                job = self.__renderer.submit(file_path, key)
+            except Busy:
+                await self.__gateway.reply(message, "Busy rendering, try again in a moment")
+                return
+            self.__spawn(self.__deliver(message, job, key))
+        elif command == "card":
+            file_path = await loop.run_in_executor(None, self.find, argument)
+            if file_path is None:
+                await self.__gateway.reply(message, "No trapsheet found for '%s'" % argument.strip())
+                return
+            start = time.perf_counter()
+            try:
+                image = await loop.run_in_executor(None, self.card, file_path)
+            except Exception as e:
+                await self.__gateway.reply(message, "Card failed: %r" % e)
+                return
+            Metrics.observe("airboss_card_seconds", time.perf_counter() - start)
+            await self.__gateway.reply(message, os.path.basename(file_path), files=[image])
+        elif command == "grades" and self.__grades is not None:
+            rows = await loop.run_in_executor(self.__queries, self.__grades.last_passes, argument.strip(), 5)
+            lines = ["%s  #%s  %s  %s" % (r["os_date"], r["pass"], r["grade"], r["details"] or "") for r in rows]
+            await self.__gateway.reply(message, "\n".join(lines) or "No grades for '%s'" % argument.strip())
+
+    def image_key(self, file_path: str) -> str:
+        options = dict(self.__renderer.profile.options(), fillins=False)
+        return ImageCache.key(file_path, Airframes.for_file(file_path).limits(), options)
+
+    def card(self, file_path: str) -> str:
+        # numpy comes with the card, the bot starts without it
+        from modules.Card import Card
+        from modules.Pass import Pass
+
+        os.makedirs(self.__renderer.out_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(file_path))[0] + "-card.png"
+        return Card().save(Pass.load(file_path), os.path.join(self.__renderer.out_dir, name))
+
+    async def __deliver(self, message: Message, job: RenderJob, key: str = None):
+        try:
+            result = await job.done
+        except Exception as e:
+            await self.__gateway.reply(message, "Render failed: %r" % e)
+            return
+        if not result.ok:
+            await self.__gateway.reply(message, "Render failed: %s" % result.error.strip().splitlines()[-1])
+            return
+        image = result.outputs[0]
+        if key is not None:
+            # requests that joined the same job find the image cached by the first one delivered
+            image = self.__images.get(key) or self.__images.put(key, image)
+        await self.__gateway.reply(message, "%s (%.1fs)" % (os.path.basename(job.file_path), result.seconds),
+                                   files=[image])
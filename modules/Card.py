@@ -0,0 +1,186 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from modules.Airframes import Airframes
+from modules.Groove import Groove
+from modules.Keys import KeysCSV as K, KeysGRV as GRV, KeysGS as GS
+from modules.Pass import Pass
+from modules.Utils import Utils
+
+
+class Card(object):
+    """ Small summary card of a pass for chat channels, drawn straight into a NumPy RGB buffer and encoded as PNG
+        without matplotlib: the groove (lateral offset) and glideslope (height) of the last cables against the
+        airframe's limit lines and bands, with pilot, grade, points and details on top. A few milliseconds per card;
+        plot_case1 stays the detailed view.
+    """
+    WIDTH = 640
+    HEIGHT = 360
+    # distance shown [cbls], the ramp is on the right as in plot_case1
+    DISTANCE = 8
+    BACKGROUND = (255, 255, 255)
+    FRAME = (160, 160, 160)
+    TRACK = (0, 0, 0)
+    TEXT = (0, 0, 0)
+    LIMIT_COLOURS = {"red": (230, 60, 50), "orange": (245, 160, 30), "green": (40, 170, 60)}
+    BAND_ALPHA = .12
+    # colours of the limit lines and of the bands between them, from one edge of the envelope to the other
+    LINE_ORDER = ["red", "orange", "green", "green", "orange", "red"]
+    BAND_ORDER = ["red", "orange", "green", "orange", "red"]
+    # 5x7 bitmap font, one 5 bit row per entry (MSB left); lower case is drawn as upper case
+    FONT = {
+        "0": (14, 17, 19, 21, 25, 17, 14), "1": (4, 12, 4, 4, 4, 4, 14), "2": (14, 17, 1, 2, 4, 8, 31),
+        "3": (31, 2, 4, 2, 1, 17, 14), "4": (2, 6, 10, 18, 31, 2, 2), "5": (31, 16, 30, 1, 1, 17, 14),
+        "6": (6, 8, 16, 30, 17, 17, 14), "7": (31, 1, 2, 4, 8, 8, 8), "8": (14, 17, 17, 14, 17, 17, 14),
+        "9": (14, 17, 17, 15, 1, 2, 12), "A": (14, 17, 17, 17, 31, 17, 17), "B": (30, 17, 17, 30, 17, 17, 30),
+        "C": (14, 17, 16, 16, 16, 17, 14), "D": (28, 18, 17, 17, 17, 18, 28), "E": (31, 16, 16, 30, 16, 16, 31),
+        "F": (31, 16, 16, 30, 16, 16, 16), "G": (14, 17, 16, 23, 17, 17, 15), "H": (17, 17, 17, 31, 17, 17, 17),
+        "I": (14, 4, 4, 4, 4, 4, 14), "J": (7, 2, 2, 2, 2, 18, 12), "K": (17, 18, 20, 24, 20, 18, 17),
+        "L": (16, 16, 16, 16, 16, 16, 31), "M": (17, 27, 21, 21, 17, 17, 17), "N": (17, 17, 25, 21, 19, 17, 17),
+        "O": (14, 17, 17, 17, 17, 17, 14), "P": (30, 17, 17, 30, 16, 16, 16), "Q": (14, 17, 17, 17, 21, 18, 13),
+        "R": (30, 17, 17, 30, 20, 18, 17), "S": (15, 16, 16, 14, 1, 1, 30), "T": (31, 4, 4, 4, 4, 4, 4),
+        "U": (17, 17, 17, 17, 17, 17, 14), "V": (17, 17, 17, 17, 17, 10, 4), "W": (17, 17, 17, 21, 21, 21, 10),
+        "X": (17, 17, 10, 4, 10, 17, 17), "Y": (17, 17, 17, 10, 4, 4, 4), "Z": (31, 1, 2, 4, 8, 16, 31),
+        " ": (0, 0, 0, 0, 0, 0, 0), "-": (0, 0, 0, 31, 0, 0, 0), "_": (0, 0, 0, 0, 0, 0, 31),
+        ".": (0, 0, 0, 0, 0, 12, 12), ",": (0, 0, 0, 0, 12, 4, 8), ":": (0, 12, 12, 0, 12, 12, 0),
+        "(": (2, 4, 8, 8, 8, 4, 2), ")": (8, 4, 2, 2, 2, 4, 8), "/": (0, 1, 2, 4, 8, 16, 0),
+        "#": (10, 10, 31, 10, 31, 10, 10), "|": (4, 4, 4, 4, 4, 4, 4), "'": (12, 4, 8, 0, 0, 0, 0),
+        "+": (0, 4, 4, 31, 4, 4, 0), "?": (14, 17, 1, 2, 4, 0, 4),
+    }
+    __glyphs = None
+
+    def __init__(self, width: int = WIDTH, height: int = HEIGHT):
+        self.width = width
+        self.height = height
+        self.__band_colours = None
+
+    @staticmethod
+    def glyph(char: str, scale: int = 1) -> np.ndarray:
+        """ 7x5 boolean bitmap of a character, every pixel repeated to scale x scale """
+        if Card.__glyphs is None:
+            Card.__glyphs = {}
+        char = char.upper() if char.upper() in Card.FONT else "?"
+        if (char, scale) not in Card.__glyphs:
+            bitmap = (np.array(Card.FONT[char])[:, None] >> np.arange(4, -1, -1)) & 1 > 0
+            Card.__glyphs[(char, scale)] = bitmap.repeat(scale, axis=0).repeat(scale, axis=1)
+        return Card.__glyphs[(char, scale)]
+
+    def text(self, image: np.ndarray, x: int, y: int, text: str, colour: tuple = TEXT, scale: int = 2):
+        """ Draws text with its top left corner at (x, y), clipped at the right edge """
+        for i, char in enumerate(text):
+            left = x + i * 6 * scale
+            if left + 5 * scale > image.shape[1]:
+                break
+            image[y:y + 7 * scale, left:left + 5 * scale][self.glyph(char, scale)] = colour
+
+    @staticmethod
+    def polyline(image: np.ndarray, px: np.ndarray, py: np.ndarray, colour: tuple):
+        """ Draws the polyline through pixel coordinates px, py: every segment is sampled once per pixel of its
+            longer side, all segments at once. Points that are not finite are left out.
+        """
+        drawn = np.isfinite(px) & np.isfinite(py)
+        px, py = px[drawn], py[drawn]
+        if len(px) < 2:
+            return
+        dx, dy = np.diff(px), np.diff(py)
+        steps = np.maximum(np.ceil(np.maximum(np.abs(dx), np.abs(dy))), 1).astype(np.int64)
+        segment = np.repeat(np.arange(len(dx)), steps)
+        t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+        x = np.rint(px[segment] + dx[segment] * t).astype(np.int64)
+        y = np.rint(py[segment] + dy[segment] * t).astype(np.int64)
+        inside = (x >= 0) & (x < image.shape[1]) & (y >= 0) & (y < image.shape[0])
+        image[y[inside], x[inside]] = colour
+
+    def bands(self, image: np.ndarray, box: tuple, line_rows: list):
+        """ Fills the panel box with the limit bands: line_rows are the pixel rows per column of the limit lines from
+            one edge of the envelope to the other, a pixel's band is the number of lines it lies below
+        """
+        left, top, right, bottom = box
+        if self.__band_colours is None:
+            background = np.array(self.BACKGROUND, dtype=np.float64)
+            colours = [background] + [background * (1 - self.BAND_ALPHA) + np.array(
+                self.LIMIT_COLOURS[c]) * self.BAND_ALPHA for c in self.BAND_ORDER] + [background]
+            self.__band_colours = np.array(colours).astype(np.uint8)
+        rows = np.arange(top, bottom)[:, None]
+        below = sum((rows >= line).astype(np.int8) for line in line_rows)
+        image[top:bottom, left:right] = self.__band_colours[below]
+
+    def __panel(self, image: np.ndarray, box: tuple, y_range: tuple, envelope: tuple, limits: list,
+                distance: np.ndarray, values: np.ndarray, label: str):
+        """ box: left, top, right, bottom [px]. y_range: data values at the top and the bottom edge """
+        left, top, right, bottom = box
+        y_top, y_bottom = y_range
+
+        def to_x(d):
+            return right - (d / self.DISTANCE) * (right - left)
+
+        def to_y(v):
+            return top + (v - y_top) / (y_bottom - y_top) * (bottom - top)
+
+        columns = np.arange(left, right)
+        column_distance = (right - columns) / (right - left) * self.DISTANCE
+        envelope_x, lines = envelope
+        order = np.argsort(envelope_x)
+        # no lines nor bands closer than the envelope starts
+        line_rows = {key: to_y(np.interp(column_distance, envelope_x[order], lines[key][order], left=np.nan))
+                     for key in lines}
+        self.bands(image, box, [line_rows[key] for key in limits])
+        for key, colour in zip(limits, self.LINE_ORDER):
+            self.polyline(image, columns.astype(np.float64), line_rows[key], self.LIMIT_COLOURS[colour])
+
+        image[top, left:right] = image[bottom - 1, left:right] = self.FRAME
+        image[top:bottom, left] = image[top:bottom, right - 1] = self.FRAME
+        shown = (distance >= 0) & (distance <= self.DISTANCE)
+        if shown.any():
+            self.polyline(image, to_x(distance[shown]), np.clip(to_y(values[shown]), top, bottom - 1), self.TRACK)
+        self.text(image, left + 4, top + 4, label, scale=1)
+
+    def render(self, data: Pass, groove: slice = None) -> np.ndarray:
+        """ HEIGHT x WIDTH x 3 uint8 image of the pass. groove: its rows when already known """
+        image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        image[:] = self.BACKGROUND
+        airframe = Airframes.get(Airframes.airframe(data.source)) if data.source else Airframes.get(
+            Airframes.DEFAULT)
+
+        groove = data.rows(groove if groove is not None else Groove.groove_slice(data[K.x()]))
+        distance = Utils.mtrs_to_cbls(groove[K.x()].astype(np.float64))
+        grades, points, details = data[K.grade()], data[K.points()], data[K.details()]
+        grade = grades[-1] if len(grades) else "?"
+        score = "" if not len(points) or np.isnan(points[-1]) else "%.1f PTS" % points[-1]
+        self.text(image, 8, 6, "%s  %s  %s" % (data.pilot or "?", grade, score))
+        self.text(image, 8, 26, details[-1] if len(details) and details[-1] else airframe.name, scale=1)
+
+        margin, header = 8, 40
+        middle = header + (self.height - header) // 2
+        self.__panel(image, (margin, header, self.width - margin, middle - 2), (-.2, 1.6),
+                     airframe.groove_envelope(),
+                     [GRV.___lul___(), GRV.__lul__(), GRV.lul(), GRV.lur(), GRV.__lur__(), GRV.___lur___()],
+                     distance, Utils.mtrs_to_cbls(groove[K.z()].astype(np.float64)), "LINEUP")
+        self.__panel(image, (margin, middle + 2, self.width - margin, self.height - margin), (500., 0.),
+                     airframe.glideslope_envelope(),
+                     [GS.___hi___(), GS.__hi__(), GS.hi(), GS.lo(), GS.__lo__(), GS.___lo___()],
+                     distance, groove[K.alt()].astype(np.float64), "GLIDESLOPE")
+        return image
+
+    @staticmethod
+    def png(image: np.ndarray, level: int = 6) -> bytes:
+        """ PNG of an RGB uint8 image: one IDAT chunk, no row filters """
+        height, width, _ = image.shape
+        rows = np.empty((height, width * 3 + 1), dtype=np.uint8)
+        rows[:, 0] = 0
+        rows[:, 1:] = image.reshape(height, -1)
+
+        def chunk(kind: bytes, payload: bytes) -> bytes:
+            return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+                + chunk(b"IDAT", zlib.compress(rows.tobytes(), level)) + chunk(b"IEND", b""))
+
+    def save(self, data: Pass, file_path: str, groove: slice = None) -> str:
+        with open(file_path + ".tmp", "wb") as card_file:
+            card_file.write(self.png(self.render(data, groove)))
+        os.replace(file_path + ".tmp", file_path)
+        return file_path
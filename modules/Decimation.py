@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class Decimation(object):
+    """ Shape preserving reduction of the groove samples before they are resampled. The rows the caller must keep
+        (e.g. the deviations LSO calls are made on) and the first and last sample come first, then the minimum and
+        maximum of every series, then Largest-Triangle-Three-Buckets points of every series; all series keep the
+        union of those rows, sized to the budget. Trapsheet samples are evenly spaced in time, the sample index is the
+        LTTB x axis.
+    """
+
+    @staticmethod
+    def lttb(y: np.ndarray, points: int) -> np.ndarray:
+        """ Indices of the `points` samples of y that keep its visual shape (Steinarsson's LTTB) """
+        rows = len(y)
+        if points >= rows or points < 3:
+            return np.arange(rows)
+        edges = np.linspace(1, rows - 1, points - 1).astype(int)
+        keep = np.empty(points, dtype=np.int64)
+        keep[0], keep[-1] = 0, rows - 1
+        a = 0
+        # points - 2 buckets between the fixed first and last sample; with points < rows none of them is empty
+        for i in range(points - 2):
+            start, end = edges[i], edges[i + 1]
+            next_end = edges[i + 2] if i + 2 < len(edges) else rows
+            next_x = (end + next_end - 1) / 2.
+            next_y = y[end:next_end].mean()
+            candidates = np.arange(start, end)
+            areas = np.abs((a - next_x) * (y[candidates] - y[a]) - (a - candidates) * (next_y - y[a]))
+            a = candidates[np.argmax(areas)]
+            keep[i + 1] = a
+        return keep
+
+    # share of the points spent on rows outside the focus (e.g. the pattern before the plotted range)
+    OUTSIDE_SHARE = .1
+
+    @staticmethod
+    def select(series: np.ndarray, points: int, focus: np.ndarray = None, keep: np.ndarray = None) -> np.ndarray:
+        """ Sorted rows to keep of a (row, column) block, about `points` of them in all. keep: rows that are always
+            kept, before any of the budget is spent, so there are more than `points` when they alone are more.
+            focus: boolean mask of the rows that are drawn, the others only get a small share of the points.
+        """
+        rows, columns = series.shape
+        if points >= rows:
+            return np.arange(rows)
+        keep = np.union1d([0, rows - 1], [] if keep is None else keep).astype(np.int64)
+        if focus is not None and 0 < focus.sum() < rows:
+            outside = max(3, int(points * Decimation.OUTSIDE_SHARE))
+            selected = []
+            for part, share in ((focus, points - outside), (~focus, outside)):
+                part_rows = np.flatnonzero(part)
+                part_keep = np.searchsorted(part_rows, keep[part[keep]])
+                selected.append(part_rows[Decimation.select(series[part_rows], share, keep=part_keep)])
+            return np.union1d(*selected)
+        if len(keep) >= points:
+            return keep
+        # then the minimum and maximum of every series, in column order while the budget lasts
+        kept = set(keep.tolist())
+        extremes = [r for r in dict.fromkeys(np.column_stack((np.argmin(series, axis=0),
+                                                              np.argmax(series, axis=0))).ravel().tolist())
+                    if r not in kept]
+        keep = np.union1d(keep, extremes[:points - len(keep)]).astype(np.int64)
+
+        def union(per_series: int) -> np.ndarray:
+            return np.unique(np.concatenate([keep] + [Decimation.lttb(series[:, c], per_series)
+                                                      for c in range(columns)]))
+
+        # the series share many of their LTTB points, so the largest per-series count whose union still fits the
+        # budget is searched for rather than splitting it evenly
+        low, high = max(3, (points - len(keep)) // columns), points - len(keep)
+        selected = union(low)
+        if len(selected) > points:
+            return keep
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = union(middle)
+            if len(candidate) <= points:
+                selected, low = candidate, middle
+            else:
+                high = middle - 1
+        return selected
+
+    @staticmethod
+    def error(series: np.ndarray, fitted: np.ndarray, focus: np.ndarray = None) -> np.ndarray:
+        """ Largest absolute deviation per column between the samples (the focus rows only, if given) and the curve
+            fitted through the kept ones, `fitted` holding its values at the same rows
+        """
+        measured = slice(None) if focus is None else focus
+        if not len(series[measured]):
+            return np.zeros(series.shape[1])
+        return np.abs(series[measured] - fitted[measured]).max(axis=0)
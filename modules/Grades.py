@@ -0,0 +1,320 @@
+import csv
+import datetime
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.Batch import Batch
+from modules.Keys import KeysGrades as G
+from modules.Trapsheet import Trapsheet
+
+
+class GradesStore(object):
+    """ SQLite store of the Airboss *_LSOgrades.csv files, indexed for per pilot, carrier, airframe and date queries.
+        Pilot names are stored as written by Airboss ('Colt 2-1 | Nygus') and split into callsign and player.
+        Dates are ISO strings: os_date is the real date of the pass, mission_date the in-game one, mission_time
+        'HH:MM:SS+D' with D the days since the mission started.
+        The same pass shows up in several files (carriers of one server, merged server exports, each with its own
+        carrier name): every row carries a hash of the identity of its pass (pilot, pass number, airframe, real and
+        mission time) and is stored once, grade_sources records every file holding it. A pass leaves the store
+        only once no file holds it anymore.
+        Rows are linked to the trapsheet of their pass when one sits next to the grades file.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS grades (
+            id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            pilot TEXT NOT NULL,
+            callsign TEXT NOT NULL,
+            player TEXT,
+            pass INTEGER,
+            points_final REAL,
+            points_pass REAL,
+            grade TEXT,
+            details TEXT,
+            wire INTEGER,
+            tgroove REAL,
+            "case" INTEGER,
+            wind REAL,
+            modex TEXT,
+            airframe TEXT,
+            carrier_type TEXT,
+            carrier_name TEXT,
+            theatre TEXT,
+            mission_time TEXT,
+            mission_date TEXT,
+            os_date TEXT,
+            row_hash TEXT,
+            trapsheet TEXT
+        );
+        CREATE TABLE IF NOT EXISTS grade_sources (
+            row_hash TEXT NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (row_hash, source)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS grade_sources_source ON grade_sources (source);
+        CREATE INDEX IF NOT EXISTS grades_pilot ON grades (pilot, os_date);
+        CREATE INDEX IF NOT EXISTS grades_callsign ON grades (callsign, os_date);
+        CREATE INDEX IF NOT EXISTS grades_player ON grades (player, os_date);
+        CREATE INDEX IF NOT EXISTS grades_carrier_type ON grades (carrier_type, os_date);
+        CREATE INDEX IF NOT EXISTS grades_carrier_name ON grades (carrier_name, os_date);
+        CREATE INDEX IF NOT EXISTS grades_airframe ON grades (airframe, os_date);
+        CREATE INDEX IF NOT EXISTS grades_os_date ON grades (os_date);
+        CREATE INDEX IF NOT EXISTS grades_source ON grades (source);
+    """
+    # created after the columns of an older database were added
+    SCHEMA_HASH = """
+        CREATE UNIQUE INDEX IF NOT EXISTS grades_row_hash ON grades (row_hash);
+        CREATE INDEX IF NOT EXISTS grades_trapsheet ON grades (trapsheet);
+    """
+    COLUMNS = ["source", "pilot", "callsign", "player", "pass", "points_final", "points_pass", "grade", "details",
+               "wire", "tgroove", "case", "wind", "modex", "airframe", "carrier_type", "carrier_name", "theatre",
+               "mission_time", "mission_date", "os_date"]
+    ROW_COLUMNS = COLUMNS + ["row_hash", "trapsheet"]
+    # what makes two rows the same pass, whichever file and carrier name they were exported with
+    IDENTITY = ["pilot", "pass", "airframe", "os_date", "mission_time"]
+    __IDENTITY = list(map(COLUMNS.index, IDENTITY))
+    # PRAGMA user_version of the current row hashes and grade_sources
+    VERSION = 1
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # the bot queries the store from a thread of its own, one at a time
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        self.__db.row_factory = sqlite3.Row
+        self.__db.executescript(self.SCHEMA)
+        self.__migrate()
+        self.__db.executescript(self.SCHEMA_HASH)
+
+    def __migrate(self):
+        """ Brings a database written by an older version up to VERSION: adds the row hash and trapsheet columns,
+            hashes every row by the identity of its pass and drops the duplicates among them. The files it was
+            ingested from are read again on their next ingest, to learn which of them hold each pass.
+        """
+        if self.__db.execute("PRAGMA user_version").fetchone()[0] >= self.VERSION:
+            return
+        columns = [row["name"] for row in self.__db.execute("PRAGMA table_info(grades)")]
+        with self.__db:
+            if "row_hash" not in columns:
+                self.__db.execute("ALTER TABLE grades ADD COLUMN row_hash TEXT")
+                self.__db.execute("ALTER TABLE grades ADD COLUMN trapsheet TEXT")
+            self.__db.execute("DROP INDEX IF EXISTS grades_row_hash")
+            seen = set()
+            for row in self.__db.execute("SELECT * FROM grades ORDER BY id").fetchall():
+                values = dict(row, mission_time=self.mission_time(row["mission_time"] or ""))
+                row_hash = self.row_hash(tuple(values[c] for c in self.COLUMNS))
+                if row_hash in seen:
+                    self.__db.execute("DELETE FROM grades WHERE id = ?", (row["id"],))
+                else:
+                    seen.add(row_hash)
+                    self.__db.execute("UPDATE grades SET row_hash = ?, mission_time = ? WHERE id = ?",
+                                      (row_hash, values["mission_time"], row["id"]))
+            self.__db.execute("DELETE FROM grade_sources")
+            self.__db.execute("INSERT INTO grade_sources (row_hash, source) SELECT row_hash, source FROM grades")
+            self.__db.execute("DELETE FROM sources")
+            self.__db.execute("PRAGMA user_version = %d" % self.VERSION)
+
+    def close(self):
+        self.__db.close()
+
+    @staticmethod
+    def __value(value: str):
+        value = value.strip()
+        return None if value in ("", "n/a") else value
+
+    @staticmethod
+    def __number(value: str, kind=float):
+        value = GradesStore.__value(value)
+        try:
+            return None if value is None else kind(value)
+        except ValueError:
+            return None
+
+    # month abbreviations of the OS Date column, parsed without strptime and its locale lookups
+    MONTHS = {m: i for i, m in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov",
+                                          "Dec"), 1)}
+
+    @staticmethod
+    def os_date(value: str):
+        """ 'Fri Jul  1 22:03:19 2022' -> '2022-07-01 22:03:19' """
+        value = GradesStore.__value(value)
+        if value is None:
+            return None
+        _, month, day, clock, year = value.split()
+        hour, minute, second = clock.split(":")
+        return datetime.datetime(int(year), GradesStore.MONTHS[month], int(day), int(hour), int(minute),
+                                 int(second)).isoformat(" ")
+
+    @staticmethod
+    def mission_date(value: str):
+        """ '2016/6/21' -> '2016-06-21' """
+        value = GradesStore.__value(value)
+        if value is None:
+            return None
+        year, month, day = value.split("/")
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+
+    @staticmethod
+    def mission_time(value: str):
+        """ '10:47:57+0' or '5:53:15' -> '10:47:57+0' / '05:53:15+0' """
+        value = GradesStore.__value(value)
+        if value is None:
+            return None
+        clock, _, days = value.partition("+")
+        hour, minute, second = clock.split(":")
+        return "%s+%d" % (datetime.time(int(hour), int(minute), int(second)).isoformat(), int(days or 0))
+
+    @staticmethod
+    def row_hash(row: tuple) -> str:
+        """ Stable hash of the IDENTITY columns of a row of COLUMNS """
+        return hashlib.sha1("\x1f".join("" if row[i] is None else repr(row[i]) for i in GradesStore.__IDENTITY)
+                            .encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def row(source: str, record: dict) -> tuple:
+        pilot = record[G.name()].strip()
+        callsign, _, player = pilot.partition(" | ")
+        number = GradesStore.__number
+        value = GradesStore.__value
+        return (source, pilot, callsign.strip(), player.strip() or None,
+                number(record[G.pass_()], int), number(record[G.points_final()]), number(record[G.points_pass()]),
+                value(record[G.grade()]), value(record[G.details()]), number(record[G.wire()], int),
+                number(record[G.tgroove()]), number(record[G.case()], int), number(record[G.wind()]),
+                value(record[G.modex()]), value(record[G.airframe()]), value(record[G.carrier_type()]),
+                value(record[G.carrier_name()]), value(record[G.theatre()]),
+                GradesStore.mission_time(record[G.mission_time()]), GradesStore.mission_date(record[G.mission_date()]),
+                GradesStore.os_date(record[G.os_date()]))
+
+    @staticmethod
+    def read(file_path: str) -> list:
+        """ Rows of ROW_COLUMNS of a grades file, trapsheet not linked yet. Runs in the ingest workers. """
+        source = os.path.abspath(file_path)
+        with open(source, "r", newline="") as grades_file:
+            rows = [GradesStore.row(source, record) for record in csv.DictReader(grades_file)]
+        return [row + (GradesStore.row_hash(row), None) for row in rows]
+
+    @staticmethod
+    def trapsheets(directory: str) -> dict:
+        """ (carrier name, pilot as in the grades, airframe, pass) -> trapsheet of the pass, for a directory """
+        found = {}
+        for file_path in Batch(directory).trapsheets():
+            meta = Trapsheet.metadata(file_path)
+            if meta["pilot"] is not None:
+                # Airboss writes the 'Callsign | Player' of the grades as 'Callsign _ Player' in file names
+                found[(meta["carrier"], meta["pilot"].replace(" _ ", " | "), meta["airframe"],
+                       meta["number"])] = os.path.abspath(file_path)
+        return found
+
+    def ingest(self, file_path: str) -> int:
+        """ Loads a grades file, replacing what an earlier version of the same file put in. Returns the passes added,
+            0 when the file is unchanged since it was last ingested.
+        """
+        return self.ingest_many([file_path], workers=1)[0]
+
+    def ingest_many(self, file_paths: list, workers: int = None) -> tuple:
+        """ Loads grades files, parsed in `workers` processes and stored in one transaction. Files unchanged since
+            they were last ingested are skipped. A pass already stored takes the values of the file ingested last.
+            Returns (passes added, rows of passes already stored).
+        """
+        changed = {}
+        for file_path in file_paths:
+            source = os.path.abspath(file_path)
+            stat = os.stat(source)
+            known = self.__db.execute("SELECT size, mtime_ns FROM sources WHERE path = ?", (source,)).fetchone()
+            if known is None or tuple(known) != (stat.st_size, stat.st_mtime_ns):
+                changed[source] = stat
+        if not changed:
+            return 0, 0
+        workers = min(workers or os.cpu_count() or 1, len(changed))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(self.read, changed))
+        else:
+            parsed = [self.read(source) for source in changed]
+
+        links = {directory: self.trapsheets(directory) for directory in {os.path.dirname(s) for s in changed}}
+        key = [self.ROW_COLUMNS.index(c) for c in ("carrier_name", "pilot", "airframe", "pass")]
+        row_hash = self.ROW_COLUMNS.index("row_hash")
+        rows, holders, seen, read = [], [], set(), 0
+        for source, file_rows in zip(changed, parsed):
+            found = links[os.path.dirname(source)]
+            read += len(file_rows)
+            for row in file_rows:
+                holders.append((row[row_hash], source))
+                # duplicates among the new files are dropped here, those of stored rows update them
+                if row[row_hash] not in seen:
+                    seen.add(row[row_hash])
+                    rows.append(row[:-1] + (found.get(tuple(row[i] for i in key)),))
+
+        sources = [(source,) for source in changed]
+        updated = [c for c in self.ROW_COLUMNS if c not in ("row_hash", "trapsheet")]
+        with self.__db:
+            self.__db.executemany("DELETE FROM grade_sources WHERE source = ?", sources)
+            self.__db.executemany("INSERT OR IGNORE INTO grade_sources (row_hash, source) VALUES (?, ?)", holders)
+            before = self.__count()
+            self.__db.executemany(
+                "INSERT INTO grades (%s) VALUES (%s) ON CONFLICT (row_hash) DO UPDATE SET %s, "
+                "trapsheet = COALESCE(excluded.trapsheet, trapsheet)" % (
+                    ", ".join('"%s"' % c for c in self.ROW_COLUMNS), ", ".join("?" * len(self.ROW_COLUMNS)),
+                    ", ".join('"%s" = excluded."%s"' % (c, c) for c in updated)), rows)
+            added = self.__count() - before
+            # passes the changed files put in and no longer hold: kept from another file holding them, else dropped
+            self.__db.executemany(
+                "DELETE FROM grades WHERE source = ? AND NOT EXISTS ("
+                "SELECT 1 FROM grade_sources h WHERE h.row_hash = grades.row_hash)", sources)
+            self.__db.executemany(
+                "UPDATE grades SET source = (SELECT MIN(h.source) FROM grade_sources h WHERE h.row_hash = "
+                "grades.row_hash) WHERE source = ? AND NOT EXISTS (SELECT 1 FROM grade_sources h WHERE "
+                "h.row_hash = grades.row_hash AND h.source = grades.source)", sources)
+            self.__db.executemany("INSERT OR REPLACE INTO sources (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                  [(source, stat.st_size, stat.st_mtime_ns) for source, stat in changed.items()])
+        return added, read - added
+
+    def __count(self) -> int:
+        return self.__db.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+
+    def passes(self, pilot: str = None, carrier: str = None, airframe: str = None, case: int = None,
+               since=None, until=None, limit: int = None) -> list:
+        """ Passes matching every given filter, newest first.
+            pilot: full Airboss name, callsign or player. carrier: carrier type (CVN_75) or name.
+            since/until: datetime, date or ISO string, compared with the real (OS) date of the pass.
+        """
+        where = []
+        params = []
+        if pilot is not None:
+            where.append("(pilot = ? OR callsign = ? OR player = ?)")
+            params += [pilot] * 3
+        if carrier is not None:
+            where.append("(carrier_type = ? OR carrier_name = ?)")
+            params += [carrier] * 2
+        if airframe is not None:
+            where.append("airframe = ?")
+            params.append(airframe)
+        if case is not None:
+            where.append('"case" = ?')
+            params.append(case)
+        if since is not None:
+            where.append("os_date >= ?")
+            params.append(str(since))
+        if until is not None:
+            where.append("os_date < ?")
+            params.append(str(until))
+        query = "SELECT * FROM grades"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY os_date DESC, pass DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.__db.execute(query, params)]
+
+    def last_passes(self, pilot: str, count: int = 10) -> list:
+        return self.passes(pilot=pilot, limit=count)
@@ -0,0 +1,20 @@
+import numpy as np
+
+
+class Groove(object):
+    @staticmethod
+    def downwind_index(x) -> int:
+        """ Index of the first sample after the downwind leg: the first positive X that is smaller than the largest
+            positive X before it, i.e. the aircraft turned back towards the carrier. 0 when the pass never turned
+            (the whole trapsheet is the groove).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        positive = x > 0
+        running_max = np.maximum.accumulate(np.where(positive, x, -np.inf))
+        prior_max = np.concatenate(([-np.inf], running_max[:-1]))
+        turned = positive & (x < prior_max)
+        return int(np.argmax(turned)) if turned.any() else 0
+
+    @staticmethod
+    def groove_slice(x) -> slice:
+        return slice(Groove.downwind_index(x), None)
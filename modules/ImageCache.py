@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+
+class ImageCache(object):
+    """ Rendered images keyed by a hash of the trapsheet contents, the limits profile it was drawn against and the
+        render options. Holds at most `max_bytes`, least recently used images are evicted first; recency survives
+        restarts through the files' mtimes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.__cache_dir = cache_dir
+        self.__max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        with os.scandir(cache_dir) as files:
+            for entry in files:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        # oldest first, the end of the dict is the most recently used
+        self.__entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.__bytes = sum(self.__entries.values())
+
+    @staticmethod
+    def key(file_path: str, limits: dict, options: dict) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as data_file:
+            for chunk in iter(lambda: data_file.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(json.dumps(limits, sort_keys=True).encode("utf-8"))
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def size(self) -> int:
+        return self.__bytes
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.__cache_dir, name)
+
+    def get(self, key: str, extension: str = ".png"):
+        """ Path of the cached image, None on a miss """
+        name = key + extension
+        if name not in self.__entries:
+            return None
+        path = self.__path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.__bytes -= self.__entries.pop(name)
+            return None
+        self.__entries.move_to_end(name)
+        return path
+
+    def put(self, key: str, image_path: str) -> str:
+        """ Copies a rendered image into the cache and returns its cached path """
+        name = key + os.path.splitext(image_path)[1]
+        path = self.__path(name)
+        shutil.copyfile(image_path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.__bytes -= self.__entries.pop(name, 0)
+        self.__entries[name] = os.path.getsize(path)
+        self.__bytes += self.__entries[name]
+        self.__evict()
+        return path
+
+    def __evict(self):
+        while self.__bytes > self.__max_bytes and len(self.__entries) > 1:
+            name, size = self.__entries.popitem(last=False)
+            self.__bytes -= size
+            try:
+                os.remove(self.__path(name))
+            except FileNotFoundError:
+                pass
@@ -21,6 +21,14 @@ class KeysAirframes:
     def av8():
         return "AV-8B"
 
+    @staticmethod
+    def t45():
+        return "T-45C"
+
+    @staticmethod
+    def a4():
+        return "A-4E-C"
+
 
 class KeysAoA(Common):
     @staticmethod
@@ -185,3 +193,112 @@ class KeysCSV:
     def details():
         return "Details"
 
+
+class KeysGrades:
+    @staticmethod
+    def name():
+        return "Name"
+
+    @staticmethod
+    def pass_():
+        return "Pass"
+
+    @staticmethod
+    def points_final():
+        return "Points Final"
+
+    @staticmethod
+    def points_pass():
+        return "Points Pass"
+
+    @staticmethod
+    def grade():
+        return "Grade"
+
+    @staticmethod
+    def details():
+        return "Details"
+
+    @staticmethod
+    def wire():
+        return "Wire"
+
+    @staticmethod
+    def tgroove():
+        return "Tgroove"
+
+    @staticmethod
+    def case():
+        return "Case"
+
+    @staticmethod
+    def wind():
+        return "Wind"
+
+    @staticmethod
+    def modex():
+        return "Modex"
+
+    @staticmethod
+    def airframe():
+        return "Airframe"
+
+    @staticmethod
+    def carrier_type():
+        return "Carrier Type"
+
+    @staticmethod
+    def carrier_name():
+        return "Carrier Name"
+
+    @staticmethod
+    def theatre():
+        return "Theatre"
+
+    @staticmethod
+    def mission_time():
+        return "Mission Time"
+
+    @staticmethod
+    def mission_date():
+        return "Mission Date"
+
+    @staticmethod
+    def os_date():
+        return "OS Date"
+
+
+class KeysSteps:
+    @staticmethod
+    def none():
+        return "n/a"
+
+    @staticmethod
+    def start():
+        return "X0"
+
+    @staticmethod
+    def x():
+        return "XX"
+
+    @staticmethod
+    def im():
+        return "IM"
+
+    @staticmethod
+    def ic():
+        return "IC"
+
+    @staticmethod
+    def ar():
+        return "AR"
+
+    @staticmethod
+    def iw():
+        return "IW"
+
+    @staticmethod
+    def graded():
+        """ Graded steps, in groove order, and their names in the grading details """
+        return {KeysSteps.x(): "X", KeysSteps.im(): "IM", KeysSteps.ic(): "IC", KeysSteps.ar(): "AR",
+                KeysSteps.iw(): "IW"}
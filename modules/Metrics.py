@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import time
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer(object):
+    def __init__(self, name: str, labels: dict):
+        self.__name = name
+        self.__labels = labels
+        self.__start = None
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        Metrics.observe(self.__name, time.perf_counter() - self.__start, **self.__labels)
+        return False
+
+
+class LogSink(object):
+    """ One JSON line per observation, e.g. {"ts": ..., "type": "histogram", "metric": ..., "labels": {...}, ...} """
+
+    def __init__(self, stream=None):
+        self.__stream = stream or sys.stderr
+
+    def record(self, kind: str, name: str, labels: dict, value: float):
+        self.__stream.write(json.dumps({"ts": round(time.time(), 3), "type": kind, "metric": name, "labels": labels,
+                                        "value": value}) + "\n")
+
+    def flush(self):
+        self.__stream.flush()
+
+
+class PrometheusSink(object):
+    """ Writes the registry in the Prometheus text format to a file on flush (node_exporter textfile collector) """
+
+    def __init__(self, file_path: str):
+        self.__file_path = file_path
+
+    def record(self, kind: str, name: str, labels: dict, value: float):
+        pass
+
+    def flush(self):
+        directory = os.path.dirname(self.__file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.__file_path + ".tmp", "w") as metrics_file:
+            metrics_file.write(Metrics.prometheus())
+        os.replace(self.__file_path + ".tmp", self.__file_path)
+
+
+class Metrics(object):
+    """ Process wide counters and histograms, off unless enable() was called. While off every call returns right
+        away and timer() hands out a shared no-op context manager, so instrumented code pays one function call.
+        Sinks get each observation as it happens (record) and the whole registry on flush. Render workers enable a
+        buffer instead, their observations travel back with the result and are replayed in the parent.
+    """
+    BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+    HELP = {
+        "airboss_stage_seconds": "duration of a Plotter stage",
+        "airboss_renders_total": "passes rendered",
+        "airboss_render_failures_total": "passes that failed to render",
+        "airboss_queue_wait_seconds": "time a bot render job waited in the queue",
+        "airboss_render_seconds": "time a bot render job took in the worker",
+        "airboss_render_rejected_total": "bot render requests rejected with the queue full",
+        "airboss_render_joined_total": "bot render requests that joined a job already queued or running",
+        "airboss_card_seconds": "time the bot took to draw a summary card",
+    }
+
+    __NULL_TIMER = _NullTimer()
+    __sinks = None
+    __buffer = None
+    __counters = {}
+    __histograms = {}
+
+    @staticmethod
+    def enable(sinks: list = None, buffer: bool = False):
+        Metrics.__sinks = list(sinks or [])
+        Metrics.__buffer = [] if buffer else None
+
+    @staticmethod
+    def disable():
+        Metrics.__sinks = None
+        Metrics.__buffer = None
+        Metrics.__counters = {}
+        Metrics.__histograms = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return Metrics.__sinks is not None
+
+    @staticmethod
+    def __record(kind: str, name: str, value: float, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        if kind == "counter":
+            Metrics.__counters[key] = Metrics.__counters.get(key, 0) + value
+        else:
+            histogram = Metrics.__histograms.get(key)
+            if histogram is None:
+                histogram = Metrics.__histograms[key] = [[0] * len(Metrics.BUCKETS), 0., 0]
+            for i, bound in enumerate(Metrics.BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        if Metrics.__buffer is not None:
+            Metrics.__buffer.append((kind, name, labels, value))
+        for sink in Metrics.__sinks:
+            sink.record(kind, name, labels, value)
+
+    @staticmethod
+    def count(name: str, value: float = 1, **labels):
+        if Metrics.__sinks is not None:
+            Metrics.__record("counter", name, value, labels)
+
+    @staticmethod
+    def observe(name: str, value: float, **labels):
+        if Metrics.__sinks is not None:
+            Metrics.__record("histogram", name, value, labels)
+
+    @staticmethod
+    def timer(name: str, **labels):
+        """ Context manager observing its duration [s] in the histogram `name` """
+        if Metrics.__sinks is None:
+            return Metrics.__NULL_TIMER
+        return _Timer(name, labels)
+
+    @staticmethod
+    def drain() -> list:
+        """ Observations buffered since the last drain, None when not buffering """
+        if Metrics.__buffer is None:
+            return None
+        observations, Metrics.__buffer = Metrics.__buffer, []
+        return observations
+
+    @staticmethod
+    def replay(observations: list):
+        """ Records observations drained in another process """
+        if Metrics.__sinks is not None:
+            for kind, name, labels, value in observations or []:
+                Metrics.__record(kind, name, value, labels)
+
+    @staticmethod
+    def flush():
+        for sink in Metrics.__sinks or []:
+            sink.flush()
+
+    @staticmethod
+    def __labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = ['%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels + extra]
+        return "{%s}" % ",".join(pairs) if pairs else ""
+
+    @staticmethod
+    def prometheus() -> str:
+        """ The registry in the Prometheus text exposition format """
+        lines = []
+        typed = set()
+
+        def header(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                if name in Metrics.HELP:
+                    lines.append("# HELP %s %s" % (name, Metrics.HELP[name]))
+                lines.append("# TYPE %s %s" % (name, kind))
+
+        for (name, labels), value in sorted(Metrics.__counters.items()):
+            header(name, "counter")
+            lines.append("%s%s %s" % (name, Metrics.__labels(labels), repr(float(value))))
+        for (name, labels), (buckets, total, count) in sorted(Metrics.__histograms.items()):
+            header(name, "histogram")
+            for bound, bucket in zip(Metrics.BUCKETS, buckets):
+                lines.append("%s_bucket%s %d" % (name, Metrics.__labels(labels, (("le", repr(bound)),)), bucket))
+            lines.append("%s_bucket%s %d" % (name, Metrics.__labels(labels, (("le", "+Inf"),)), count))
+            lines.append("%s_sum%s %s" % (name, Metrics.__labels(labels), repr(total)))
+            lines.append("%s_count%s %d" % (name, Metrics.__labels(labels), count))
+        return "\n".join(lines) + "\n"
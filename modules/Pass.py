@@ -0,0 +1,108 @@
+import numpy as np
+
+from modules.Keys import KeysCSV as K
+from modules.StepIndex import StepIndex
+from modules.Trapsheet import Trapsheet
+from modules.TrapsheetCache import TrapsheetCache
+
+
+class Pass(object):
+    """ Compact in-memory pass: the numeric columns as one float32 block with a contiguous array per column, the text
+        columns (Step, Grade, Details) as small integer codes into per pass category tuples, and the file name
+        metadata in slots. A 2000 row trapsheet takes ~125 KiB instead of the ~580 KiB of its DataFrame.
+        p[column] returns the column (text columns decoded), p.rows(slice) a Pass sharing this one's arrays and
+        p.steps the row ranges of the groove steps.
+    """
+    __slots__ = ("source", "carrier", "pilot", "callsign", "player", "modex", "airframe", "number",
+                 "__values", "__codes", "__categories", "__steps")
+
+    NUMERIC = Trapsheet.numeric_columns()
+    TEXT = Trapsheet.text_columns()
+    __INDEX = {column: i for i, column in enumerate(NUMERIC)}
+
+    def __init__(self, values: np.ndarray, codes: dict, categories: dict, meta: dict = None, source: str = None,
+                 modex: str = None):
+        """ values: float32 (column, row) block in NUMERIC order. codes/categories: text column -> codes/values """
+        meta = meta or {}
+        self.source = source
+        self.carrier = meta.get("carrier")
+        self.pilot = meta.get("pilot")
+        self.callsign = meta.get("callsign")
+        self.player = meta.get("player")
+        self.airframe = meta.get("airframe")
+        self.number = meta.get("number")
+        # not part of the trapsheet name, known from the LSO grades of the pass
+        self.modex = modex
+        self.__values = values
+        self.__codes = codes
+        self.__categories = categories
+        self.__steps = None
+
+    @staticmethod
+    def encode(values) -> tuple:
+        """ (codes, categories) of a text column, codes in the smallest unsigned dtype that holds them """
+        categories, codes = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        return codes.astype(np.min_scalar_type(max(len(categories) - 1, 0))), tuple(categories.tolist())
+
+    @staticmethod
+    def from_columns(columns, source: str = None, modex: str = None) -> "Pass":
+        """ From a DataFrame or a column -> array mapping holding every trapsheet column """
+        values = np.empty((len(Pass.NUMERIC), len(columns[K.time()])), dtype=np.float32)
+        for i, column in enumerate(Pass.NUMERIC):
+            values[i] = np.asarray(columns[column], dtype=np.float32)
+        codes, categories = {}, {}
+        for column in Pass.TEXT:
+            codes[column], categories[column] = Pass.encode(columns[column])
+        meta = Trapsheet.metadata(source) if source else None
+        return Pass(values, codes, categories, meta, source, modex)
+
+    @staticmethod
+    def load(file_path: str, cache: TrapsheetCache = None, modex: str = None) -> "Pass":
+        data = cache.arrays(file_path) if cache else Trapsheet.load(file_path)
+        return Pass.from_columns(data, file_path, modex)
+
+    def __len__(self) -> int:
+        return self.__values.shape[1]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column in self.__codes:
+            return np.asarray(self.__categories[column], dtype=object)[self.__codes[column]]
+        return self.__values[self.__INDEX[column]]
+
+    def codes(self, column: str) -> np.ndarray:
+        return self.__codes[column]
+
+    def categories(self, column: str) -> tuple:
+        return self.__categories[column]
+
+    def rows(self, rows: slice) -> "Pass":
+        """ The rows of a slice, e.g. the groove, as a Pass viewing this one's arrays """
+        view = Pass(self.__values[:, rows], {c: codes[rows] for c, codes in self.__codes.items()}, self.__categories)
+        for attribute in ("source", "carrier", "pilot", "callsign", "player", "modex", "airframe", "number"):
+            setattr(view, attribute, getattr(self, attribute))
+        return view
+
+    @property
+    def values(self) -> np.ndarray:
+        """ The float32 (column, row) block, columns in NUMERIC order """
+        return self.__values
+
+    @property
+    def steps(self) -> StepIndex:
+        """ Step index of these rows, built on first use """
+        if self.__steps is None:
+            self.__steps = StepIndex.build(self.__codes[K.step()], self.__categories[K.step()], self[K.x()],
+                                           self[K.time()])
+        return self.__steps
+
+    @property
+    def nbytes(self) -> int:
+        return self.__values.nbytes + sum(codes.nbytes for codes in self.__codes.values())
+
+    def frame(self):
+        """ pandas DataFrame of the pass in trapsheet column order, text columns as Categoricals """
+        import pandas as pd
+
+        data = {column: self[column] if column in self.__INDEX else pd.Categorical.from_codes(
+            self.__codes[column], self.__categories[column]) for column in Trapsheet.columns()}
+        return pd.DataFrame(data)
@@ -0,0 +1,43 @@
+class OutputProfile(object):
+    """ How a rendered figure is written: resolution, format, transparency and an optional figure size [inches].
+        max_bytes: the image is written again at a lower dpi until it fits (e.g. chat attachment limits).
+    """
+
+    def __init__(self, name: str, dpi: int, format: str = "png", transparent: bool = False, suffix: str = "",
+                 size: tuple = None, max_bytes: int = None):
+        self.name = name
+        self.dpi = dpi
+        self.format = format
+        self.transparent = transparent
+        self.suffix = suffix
+        self.size = size
+        self.max_bytes = max_bytes
+
+    def file_name(self, file_name: str) -> str:
+        return "%s%s.%s" % (file_name, self.suffix, self.format)
+
+    def options(self) -> dict:
+        return {"name": self.name, "dpi": self.dpi, "format": self.format, "transparent": self.transparent,
+                "size": self.size, "max_bytes": self.max_bytes}
+
+
+class Profiles(object):
+    PRINT = OutputProfile("print", dpi=300)
+    OVERLAY = OutputProfile("overlay", dpi=300, transparent=True, suffix="-alpha")
+    # Discord's attachment limit for non-boosted servers is 10 MB, stay well below it
+    DISCORD_PREVIEW = OutputProfile("preview", dpi=60, suffix="-preview", max_bytes=8 * 1024 * 1024)
+    VECTOR = OutputProfile("vector", dpi=100, format="svg")
+
+    DEFAULT = [PRINT, OVERLAY]
+
+    @staticmethod
+    def all() -> dict:
+        return {p.name: p for p in (Profiles.PRINT, Profiles.OVERLAY, Profiles.DISCORD_PREVIEW, Profiles.VECTOR)}
+
+    @staticmethod
+    def get(profiles) -> list:
+        """ OutputProfiles for a list of names and/or profiles, the default print + overlay pair for None """
+        if profiles is None:
+            return list(Profiles.DEFAULT)
+        known = Profiles.all()
+        return [known[p] if isinstance(p, str) else p for p in profiles]
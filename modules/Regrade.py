@@ -0,0 +1,149 @@
+import re
+
+import numpy as np
+
+from modules.Airframes import AirframeLimits, Airframes
+from modules.Keys import KeysAoA as AoA, KeysCSV as K, KeysGRV as GRV, KeysGS as GS, KeysSteps as S
+from modules.Pass import Pass
+from modules.TrapsheetCache import TrapsheetCache
+
+
+class Regrade(object):
+    """ Deviation calls of many passes recomputed from their trapsheet samples and compared with the Details Airboss
+        wrote. As Airboss does, every graded step keeps the AoA (off on-speed), GSE and LUE sample deviating most and
+        calls it against the airframe's limits: little (x), normal x or underlined _x_. Samples past the ramp are not
+        graded. All passes are classified at once: their graded samples are concatenated and the extremes of every
+        (pass, step) are two reductions over the whole archive.
+
+        calls[pass, step, series] are signed levels: +1..+3 for the call above the limits (SLO, H, LUR), -1..-3 for
+        the one below (F, LO, LUL), 0 for none; `recorded` holds the same parsed from Details, `flown` which steps
+        a pass has samples of. Overshoot, angled approach, drift and fly-through calls are not re-graded.
+    """
+    # graded trapsheet step -> its name in the details, in groove order
+    STEPS = S.graded()
+    SERIES = [K.aoa(), K.gse(), K.lue()]
+    # series -> (call above the limits, call below)
+    CALLS = {K.aoa(): ("SLO", "F"), K.gse(): ("H", "LO"), K.lue(): ("LUR", "LUL")}
+    LEVELS = {1: "(%s)", 2: "%s", 3: "_%s_"}
+    # every token of a details string, calls containing other calls first ('SLO' before 'LO')
+    __TOKENS = re.compile(r"SLO|LUL|LUR|LIG|LO|OS|AA|DL|DR|F|H|IM|IC|AR|IW|X|[_()]|.", re.S)
+
+    def __init__(self, names: list, calls: np.ndarray, recorded: np.ndarray, flown: np.ndarray):
+        self.names = names
+        self.calls = calls
+        self.recorded = recorded
+        self.flown = flown
+
+    @staticmethod
+    def limits(airframe: AirframeLimits) -> tuple:
+        """ (reference, above, below) of AoA, GSE and LUE: the on-speed / on-glideslope / on-centreline value and
+            the little, normal and underlined limits on either side
+        """
+        aoa, gse, grv = airframe.aoa, airframe.gse, airframe.grv
+        reference = [aoa[AoA.ok()], gse[GS.gs()], grv[GRV.ok()]]
+        above = [[aoa[AoA.slo_lo()], aoa[AoA.slo_med()], aoa[AoA.slo_hi()]],
+                 [gse[GS.hi()], gse[GS.__hi__()], gse[GS.___hi___()]],
+                 [grv[GRV.lur()], grv[GRV.__lur__()], grv[GRV.___lur___()]]]
+        below = [[aoa[AoA.fast_lo()], aoa[AoA.fast_med()], aoa[AoA.fast_hi()]],
+                 [gse[GS.lo()], gse[GS.__lo__()], gse[GS.___lo___()]],
+                 [grv[GRV.lul()], grv[GRV.__lul__()], grv[GRV.___lul___()]]]
+        return np.array(reference), np.array(above), np.array(below)
+
+    @staticmethod
+    def parse(details: str) -> np.ndarray:
+        """ (step, series) signed levels of the deviation calls in an Airboss details string. Airboss joins
+            adjacent underlined or little calls ('_F__H_' is written '_FH_'), so '_' toggles underlining.
+        """
+        levels = np.zeros((len(Regrade.STEPS), len(Regrade.SERIES)), dtype=np.int8)
+        steps = list(Regrade.STEPS.values())
+        signs = {call: (s, sign) for s, series in enumerate(Regrade.SERIES)
+                 for call, sign in zip(Regrade.CALLS[series], (1, -1))}
+        underlined, little, pending = False, False, {}
+        for token in Regrade.__TOKENS.findall(details or ""):
+            if token == "_":
+                underlined = not underlined
+            elif token in "()":
+                little = token == "("
+            elif token in signs:
+                series, sign = signs[token]
+                pending[series] = sign * (3 if underlined else 1 if little else 2)
+            elif token in steps:
+                for series, level in pending.items():
+                    levels[steps.index(token), series] = level
+                pending = {}
+        return levels
+
+    @staticmethod
+    def from_passes(passes: list, limits: dict = None) -> "Regrade":
+        """ limits: airframe -> AirframeLimits to grade against, the Airframes registry by default """
+        limits = limits or Airframes.registry()
+        airframes = list(limits)
+        tables = [Regrade.limits(limits[a]) for a in airframes]
+        graded = list(Regrade.STEPS)
+        values, keys, kinds, recorded = [], [], [], []
+        for i, data in enumerate(passes):
+            lookup = np.array([graded.index(c) if c in graded else -1 for c in data.categories(K.step())] or [-1])
+            step = lookup[data.codes(K.step())]
+            rows = (step >= 0) & (data[K.rho()] > 0)
+            values.append(np.column_stack([data[series][rows] for series in Regrade.SERIES]))
+            keys.append(i * len(graded) + step[rows])
+            airframe = Airframes.airframe(data.source) if data.source else Airframes.DEFAULT
+            kinds.append(airframes.index(airframe if airframe in limits else Airframes.DEFAULT))
+            details = data[K.details()]
+            recorded.append(Regrade.parse(details[-1] if len(details) else ""))
+
+        shape = (len(passes), len(graded), len(Regrade.SERIES))
+        calls = np.zeros(shape, dtype=np.int8)
+        flown = np.zeros(shape[:2], dtype=bool)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        if len(keys):
+            order = np.argsort(keys, kind="stable")
+            keys, values = keys[order], np.concatenate(values).astype(np.float64)[order]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+            segment_keys = keys[starts]
+            reference, above, below = (np.array([t[j] for t in tables])[np.array(kinds)[segment_keys // len(graded)]]
+                                       for j in range(3))
+            deviation = values - np.repeat(reference, np.diff(np.append(starts, len(keys))), axis=0)
+            highest, lowest = np.maximum.reduceat(deviation, starts), np.minimum.reduceat(deviation, starts)
+            extreme = np.where(highest >= -lowest, highest, lowest) + reference
+            level = (extreme[..., None] > above).sum(-1) - (extreme[..., None] < below).sum(-1)
+            calls.reshape(-1, shape[2])[segment_keys] = level
+            flown.reshape(-1)[segment_keys] = True
+        names = [data.source for data in passes]
+        return Regrade(names, calls, np.array(recorded, dtype=np.int8).reshape(shape), flown)
+
+    @staticmethod
+    def from_files(file_paths: list, cache: TrapsheetCache = None, limits: dict = None) -> "Regrade":
+        return Regrade.from_passes([Pass.load(file_path, cache) for file_path in file_paths], limits)
+
+    @staticmethod
+    def call(series: int, level: int) -> str:
+        if not level:
+            return ""
+        return Regrade.LEVELS[abs(level)] % Regrade.CALLS[Regrade.SERIES[series]][0 if level > 0 else 1]
+
+    def details(self, i: int) -> str:
+        """ The recomputed calls of pass i written as Airboss writes them """
+        steps = []
+        for s, name in enumerate(self.STEPS.values()):
+            text = "".join(self.call(series, level) for series, level in enumerate(self.calls[i, s]))
+            steps.append(text.replace("__", "").replace(")(", "") + name if text else "")
+        return " ".join(steps).strip()
+
+    @property
+    def matches(self) -> np.ndarray:
+        """ (pass, step, series) True where the recomputed call is the recorded one, on flown steps """
+        return (self.calls == self.recorded) & self.flown[..., None]
+
+    @property
+    def agreement(self) -> float:
+        """ Share of the calls of flown steps that match the details """
+        graded = self.flown.sum() * len(self.SERIES)
+        return float(self.matches.sum() / graded) if graded else 1.
+
+    def mismatches(self) -> list:
+        """ (pass name, step, recomputed call, recorded call) of every call that differs """
+        steps = list(self.STEPS.values())
+        return [(self.names[i], steps[s], self.call(series, self.calls[i, s, series]),
+                 self.call(series, self.recorded[i, s, series]))
+                for i, s, series in np.argwhere(~self.matches & self.flown[..., None])]
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from modules.Groove import Groove
+from modules.Keys import KeysCSV as K, KeysSteps as S
+from modules.Trapsheet import Trapsheet
+from modules.TrapsheetCache import TrapsheetCache
+from modules.Utils import Utils
+
+
+class Statistics(object):
+    """ Groove statistics over many passes at once. Every groove sample of every pass sits in one flat frame, the
+        per step and per distance numbers are single grouped reductions over it.
+    """
+    METRICS = [K.gse(), K.lue(), K.aoa(), K.vy()]
+    PERCENTILES = [.1, .5, .9]
+    # trapsheet Step value -> groove step as written in the grading details
+    STEPS = S.graded()
+
+    def __init__(self, samples: pd.DataFrame):
+        self.samples = samples
+
+    @staticmethod
+    def from_files(file_paths: list, cache: TrapsheetCache = None) -> "Statistics":
+        pilots, callsigns, passes, steps, distances, metrics = [], [], [], [], [], []
+        for i, file_path in enumerate(file_paths):
+            data = cache.arrays(file_path, [K.x(), K.step()] + Statistics.METRICS) if cache \
+                else Trapsheet.load(file_path)
+            x = np.asarray(data[K.x()])
+            groove = Groove.groove_slice(x)
+            meta = Trapsheet.metadata(file_path)
+            rows = len(x[groove])
+            pilots.append(np.full(rows, meta["pilot"] or "", dtype=object))
+            callsigns.append(np.full(rows, meta["callsign"] or "", dtype=object))
+            passes.append(np.full(rows, i, dtype=np.int32))
+            steps.append(np.asarray(data[K.step()])[groove].astype(object))
+            distances.append(Utils.mtrs_to_cbls(x[groove]))
+            metrics.append(np.column_stack([np.asarray(data[m])[groove] for m in Statistics.METRICS]))
+
+        samples = pd.DataFrame(np.concatenate(metrics) if metrics else np.empty((0, len(Statistics.METRICS))),
+                               columns=Statistics.METRICS)
+        samples.insert(0, "pilot", pd.Categorical(np.concatenate(pilots) if pilots else []))
+        samples.insert(1, "callsign", pd.Categorical(np.concatenate(callsigns) if callsigns else []))
+        samples.insert(2, "pass", np.concatenate(passes) if passes else np.empty(0, dtype=np.int32))
+        samples.insert(3, "step", pd.Categorical(
+            pd.Series(np.concatenate(steps) if steps else [], dtype=object).map(Statistics.STEPS),
+            categories=list(dict.fromkeys(Statistics.STEPS.values())), ordered=True))
+        samples.insert(4, "distance", np.concatenate(distances) if distances else np.empty(0))
+        return Statistics(samples)
+
+    def select(self, pilot: str = None, squadron: str = None) -> "Statistics":
+        """ pilot: full name ('Colt 2-1 _ Nygus'), callsign or player. squadron: callsign prefix ('Colt') """
+        mask = np.ones(len(self.samples), dtype=bool)
+        if pilot is not None:
+            names = self.samples["pilot"].astype(str)
+            mask &= ((names == pilot) | (self.samples["callsign"].astype(str) == pilot)
+                     | names.str.endswith(" _ " + pilot)).to_numpy()
+        if squadron is not None:
+            mask &= self.samples["callsign"].astype(str).str.startswith(squadron).to_numpy()
+        return Statistics(self.samples[mask])
+
+    @property
+    def passes(self) -> int:
+        return self.samples["pass"].nunique()
+
+    def __describe(self, by) -> pd.DataFrame:
+        grouped = self.samples.groupby(by, observed=True)[self.METRICS]
+        stats = grouped.agg(["count", "mean", "var"])
+        quantiles = grouped.quantile(self.PERCENTILES).unstack()
+        quantiles.columns = pd.MultiIndex.from_tuples([(m, "p%d" % round(q * 100)) for m, q in quantiles.columns])
+        return pd.concat([stats, quantiles], axis=1)[
+            [(m, s) for m in self.METRICS for s in ["count", "mean", "var"] + [
+                "p%d" % round(q * 100) for q in self.PERCENTILES]]]
+
+    def by_step(self) -> pd.DataFrame:
+        """ count, mean, variance and percentiles of GSE, LUE, AoA and Vy in each groove step """
+        return self.__describe("step")
+
+    def by_distance(self, bin_width: float = 1., max_distance: float = 15.) -> pd.DataFrame:
+        """ Same as by_step, in distance bins [cbls] from the ramp """
+        edges = np.arange(0., max_distance + bin_width, bin_width)
+        bins = pd.cut(self.samples["distance"], edges, right=False)
+        return self.__describe(bins)
@@ -0,0 +1,81 @@
+import numpy as np
+
+from modules.Keys import KeysSteps as S
+from modules.Utils import Utils
+
+
+class StepRange(object):
+    def __init__(self, step: str, start: int, stop: int, distance: tuple, time: tuple):
+        self.step = step
+        # rows start..stop-1 of the pass
+        self.start = start
+        self.stop = stop
+        # (first, last) sample of the range, distance in cbls and time in seconds
+        self.distance = distance
+        self.time = time
+
+    @property
+    def rows(self) -> slice:
+        return slice(self.start, self.stop)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __repr__(self) -> str:
+        return "StepRange(%s, %d:%d, %.2f-%.2f cbls, %.1f-%.1f s)" % (
+            self.step, self.start, self.stop, self.distance[0], self.distance[1], self.time[0], self.time[1])
+
+
+class StepIndex(object):
+    """ Where each groove step (X0, XX, IM, IC, AR, IW) of a pass is: the runs of equal Step values as row ranges with
+        their distance and time bounds, found in one pass over the step codes. index[step] covers the step's first
+        to last row, so data.rows(index[S.im()].rows)[K.gse()] is the glideslope error in the middle without
+        filtering the Step column again.
+    """
+
+    def __init__(self, runs: list):
+        self.runs = runs
+        self.__spans = {}
+        for run in runs:
+            first = self.__spans.get(run.step)
+            self.__spans[run.step] = run if first is None else StepRange(
+                run.step, first.start, run.stop, (first.distance[0], run.distance[1]), (first.time[0], run.time[1]))
+
+    @staticmethod
+    def build(codes: np.ndarray, categories: tuple, x: np.ndarray, time: np.ndarray) -> "StepIndex":
+        """ codes/categories: the encoded Step column (see Pass.encode), x [m] and time [s] of the same rows """
+        codes = np.asarray(codes)
+        if not len(codes):
+            return StepIndex([])
+        starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+        stops = np.concatenate((starts[1:], [len(codes)]))
+        distance = Utils.mtrs_to_cbls(np.asarray(x, dtype=np.float64))
+        time = np.asarray(time, dtype=np.float64)
+        return StepIndex([StepRange(categories[codes[start]], int(start), int(stop),
+                                    (float(distance[start]), float(distance[stop - 1])),
+                                    (float(time[start]), float(time[stop - 1])))
+                          for start, stop in zip(starts, stops)])
+
+    @property
+    def steps(self) -> list:
+        """ Steps flown, in order of their first row; rows without a step (n/a) are not one """
+        return [step for step in self.__spans if step != S.none()]
+
+    def __contains__(self, step: str) -> bool:
+        return step in self.__spans
+
+    def __getitem__(self, step: str) -> StepRange:
+        return self.__spans[step]
+
+    def get(self, step: str) -> StepRange:
+        return self.__spans.get(step)
+
+    def at(self, row: int) -> str:
+        """ Step of a row """
+        for run in self.runs:
+            if run.start <= row < run.stop:
+                return run.step
+        raise IndexError(row)
+
+    def __repr__(self) -> str:
+        return "StepIndex(%s)" % ", ".join(repr(run) for run in self.runs)
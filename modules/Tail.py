@@ -0,0 +1,161 @@
+import os
+import time
+
+import numpy as np
+
+from modules.Keys import KeysCSV as K
+from modules.Pass import Pass
+from modules.StepIndex import StepIndex, StepRange
+from modules.Trapsheet import Trapsheet
+from modules.Utils import Utils
+
+
+class TrapsheetTail(object):
+    """ Follows a trapsheet Airboss is still writing. Every read() parses only the bytes appended since the last one
+        (a trailing partial line waits for the next read) into growable column arrays laid out as in Pass, and
+        carries the downwind turn search and the step runs forward over the new rows, so the cost of an update
+        depends on the new rows only. A file that shrank was rewritten and is followed again from its start.
+    """
+    INITIAL_ROWS = 1024
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.__meta = Trapsheet.metadata(file_path)
+        self.__reset()
+
+    def __reset(self):
+        self.__offset = 0
+        self.__partial = b""
+        self.__header = None
+        self.__rows = 0
+        self.__values = np.empty((len(Pass.NUMERIC), self.INITIAL_ROWS), dtype=np.float32)
+        self.__codes = {column: np.empty(self.INITIAL_ROWS, dtype=np.uint16) for column in Pass.TEXT}
+        self.__lookup = {column: {} for column in Pass.TEXT}
+        # downwind turn: largest positive X so far, and the first row closer than it (None before the turn)
+        self.__running_max = -np.inf
+        self.__downwind = None
+        self.__runs = []
+
+    def __len__(self) -> int:
+        return self.__rows
+
+    @property
+    def downwind_index(self) -> int:
+        """ Same as Groove.downwind_index over the rows read so far """
+        return self.__downwind or 0
+
+    @property
+    def groove(self) -> slice:
+        return slice(self.downwind_index, None)
+
+    @property
+    def steps(self) -> StepIndex:
+        return StepIndex(list(self.__runs))
+
+    def data(self) -> Pass:
+        """ The rows read so far as a Pass viewing the tail's arrays, valid until the next read() """
+        codes = {column: self.__codes[column][:self.__rows] for column in Pass.TEXT}
+        categories = {column: tuple(self.__lookup[column]) for column in Pass.TEXT}
+        return Pass(self.__values[:, :self.__rows], codes, categories, self.__meta, self.file_path)
+
+    @staticmethod
+    def __number(text: str) -> float:
+        try:
+            return float(text)
+        except ValueError:
+            return np.nan
+
+    def __grow(self, rows: int):
+        capacity = self.__values.shape[1]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        values = np.empty((len(Pass.NUMERIC), capacity), dtype=np.float32)
+        values[:, :self.__rows] = self.__values[:, :self.__rows]
+        self.__values = values
+        for column, codes in self.__codes.items():
+            self.__codes[column] = np.empty(capacity, dtype=codes.dtype)
+            self.__codes[column][:self.__rows] = codes[:self.__rows]
+
+    def read(self) -> int:
+        """ Parses the rows appended since the last read, returns how many there were """
+        try:
+            size = os.path.getsize(self.file_path)
+        except FileNotFoundError:
+            return 0
+        if size < self.__offset:
+            self.__reset()
+        if size == self.__offset:
+            return 0
+        with open(self.file_path, "rb") as data_file:
+            data_file.seek(self.__offset)
+            chunk = self.__partial + data_file.read(size - self.__offset)
+        self.__offset = size
+        lines = chunk.split(b"\n")
+        self.__partial = lines.pop()
+        lines = [line.decode("utf-8").rstrip("\r") for line in lines if line.strip()]
+        if self.__header is None and lines:
+            header = lines.pop(0).lstrip("#").strip().split(",")
+            self.__header = [header.index(column) for column in Trapsheet.columns()]
+        if not lines:
+            return 0
+
+        start = self.__rows
+        self.__grow(start + len(lines))
+        numeric = [self.__header[Trapsheet.columns().index(column)] for column in Pass.NUMERIC]
+        text = {column: self.__header[Trapsheet.columns().index(column)] for column in Pass.TEXT}
+        fields = [line.split(",") for line in lines]
+        self.__values[:, start:start + len(lines)] = np.array(
+            [[self.__number(row[i]) for i in numeric] for row in fields], dtype=np.float32).T
+        for column, i in text.items():
+            lookup = self.__lookup[column]
+            self.__codes[column][start:start + len(lines)] = [
+                lookup.setdefault(row[i].strip() if column == K.details() else row[i], len(lookup)) for row in fields]
+        self.__rows += len(lines)
+        self.__update(start)
+        return len(lines)
+
+    def __update(self, start: int):
+        """ Carries the downwind turn and the step runs over rows start.. """
+        x = self.__values[Pass.NUMERIC.index(K.x()), start:self.__rows].astype(np.float64)
+        if self.__downwind is None:
+            positive = x > 0
+            running_max = np.maximum.accumulate(np.where(positive, x, -np.inf))
+            running_max = np.maximum(running_max, self.__running_max)
+            prior_max = np.concatenate(([self.__running_max], running_max[:-1]))
+            turned = positive & (x < prior_max)
+            if turned.any():
+                self.__downwind = start + int(np.argmax(turned))
+            self.__running_max = running_max[-1]
+
+        steps = self.__codes[K.step()][start:self.__rows]
+        time_column = self.__values[Pass.NUMERIC.index(K.time()), start:self.__rows]
+        distance = Utils.mtrs_to_cbls(x)
+        categories = list(self.__lookup[K.step()])
+        boundaries = np.flatnonzero(steps[1:] != steps[:-1]) + 1
+        for run_start, run_stop in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(steps)]))):
+            step = categories[steps[run_start]]
+            bounds = (float(distance[run_start]), float(distance[run_stop - 1]))
+            times = (float(time_column[run_start]), float(time_column[run_stop - 1]))
+            previous = self.__runs[-1] if self.__runs else None
+            if previous is not None and previous.step == step and previous.stop == start + run_start:
+                self.__runs[-1] = StepRange(step, previous.start, start + int(run_stop),
+                                            (previous.distance[0], bounds[1]), (previous.time[0], times[1]))
+            else:
+                self.__runs.append(StepRange(step, start + int(run_start), start + int(run_stop), bounds, times))
+
+    def follow(self, on_update, interval: float = 2., idle: float = 30.):
+        """ Reads every `interval` seconds and calls on_update(tail, new rows) after each read that found rows;
+            returns once the file did not grow for `idle` seconds
+        """
+        last_growth = time.monotonic()
+        while True:
+            started = time.monotonic()
+            rows = self.read()
+            if rows:
+                last_growth = started
+                on_update(self, rows)
+            elif started - last_growth >= idle:
+                return
+            time.sleep(max(0., interval - (time.monotonic() - started)))
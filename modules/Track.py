@@ -0,0 +1,86 @@
+import numpy as np
+from scipy.interpolate import interp1d
+
+from modules.Decimation import Decimation
+from modules.Keys import KeysCSV as K, KeysSteps as S
+from modules.StepIndex import StepIndex
+from modules.Utils import Utils
+
+
+class Track(object):
+    """ Groove of a pass resampled onto one distance grid [cbls]. Z is converted to cables, the other series keep
+        their trapsheet units. All series share a single quadratic spline setup.
+        decimate: with more groove samples than this the spline is fitted through about that many, chosen by
+        Decimation and mostly within the plotted distance, always keeping the sample of every graded step that
+        deviates most from `reference` in AoA, GSE and LUE; `error` then holds the largest deviation of the spline
+        from the samples there, per series in its units.
+    """
+    # distance [cbls] the plots show, decimation spends its points there
+    VISIBLE = 15
+
+    @staticmethod
+    def columns() -> list:
+        return [K.z(), K.alt(), K.aoa(), K.gse(), K.lue(), K.vy(), K.roll()]
+
+    # series whose per-step extremes are graded, in the order of Regrade.limits' reference
+    GRADED = [K.aoa(), K.gse(), K.lue()]
+
+    def __init__(self, groove_data, smooth: int = 500, decimate: int = None, reference: np.ndarray = None):
+        """ groove_data: Pass or DataFrame of the groove rows (the step extremes need a Pass' steps)
+            reference: on-speed AoA, on-glideslope GSE and on-centreline LUE (see Regrade.limits)
+        """
+        x = Utils.mtrs_to_cbls(np.asarray(groove_data[K.x()], dtype=np.float64))
+        series = np.column_stack([Utils.mtrs_to_cbls(np.asarray(groove_data[K.z()], dtype=np.float64))] +
+                                 [np.asarray(groove_data[c], dtype=np.float64) for c in self.columns()[1:]])
+
+        self.samples = len(x)
+        self.error = None
+        samples = None
+        if decimate and len(x) > decimate:
+            samples, visible = (x, series), np.abs(x) <= self.VISIBLE
+            steps = getattr(groove_data, "steps", None)
+            extremes = None if steps is None or reference is None else self.extremes(
+                steps, series[:, [self.columns().index(c) for c in self.GRADED]] - reference,
+                np.asarray(groove_data[K.rho()]) > 0)
+            keep = Decimation.select(series, decimate, visible, extremes)
+            x, series = x[keep], series[keep]
+        x, series = self.distinct(x, series)
+        self.fitted = len(x)
+
+        spline = interp1d(x, series, kind='quadratic', axis=0)
+        if samples is not None:
+            # measured on the curve that is drawn: the spline through the kept samples, at every sample in view
+            fitted = spline(np.clip(samples[0], x.min(), x.max()))
+            self.error = {column: float(e) for column, e in
+                          zip(self.columns(), Decimation.error(samples[1], fitted, visible))}
+        self.distance = np.linspace(x[0], x[-1], smooth)
+        self.__values = spline(self.distance)
+        self.__index = {column: i for i, column in enumerate(self.columns())}
+
+    @staticmethod
+    def extremes(steps: StepIndex, deviation: np.ndarray, graded: np.ndarray) -> np.ndarray:
+        """ Rows of the largest |deviation| of every column in every graded step, among the graded rows (Rho > 0, as
+            Regrade grades them)
+        """
+        rows = []
+        for step in S.graded():
+            step_rows = np.concatenate([np.arange(run.start, run.stop) for run in steps.runs if run.step == step] +
+                                       [np.empty(0, dtype=np.int64)])
+            step_rows = step_rows[graded[step_rows]]
+            if len(step_rows):
+                rows.append(step_rows[np.argmax(np.abs(deviation[step_rows]), axis=0)])
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def distinct(x: np.ndarray, series: np.ndarray) -> tuple:
+        """ The spline needs distinct distances: of samples at the same distance (hovering, or a pass that stopped
+            closing) only the first is kept
+        """
+        _, first = np.unique(x, return_index=True)
+        if len(first) == len(x):
+            return x, series
+        first.sort()
+        return x[first], series[first]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.__values[:, self.__index[column]]
@@ -0,0 +1,92 @@
+import os
+import re
+from typing import TYPE_CHECKING
+
+from modules.Keys import KeysCSV as K
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class Trapsheet(object):
+    """ Time: time in seconds since start.
+        Rho: distance from rundown to player aircraft in NM.
+        X : distance parallel to the carrier in meters.
+        Z : distance perpendicular to the carrier in meters.
+        Alt: altitude of player aircraft in feet.
+        AoA: angle of attack in degrees.
+        GSE: glideslope error in degrees.
+        LUE: lineup error in degrees.
+        Vtot: total velocity of player aircraft in knots.
+        Vy: vertical (descent) velocity in ft/min.
+        Gamma: angle between vector of aircraft nose and vector point in the direction of the carrier runway in degrees.
+        Pitch: pitch angle of player aircraft in degrees.
+        Roll: roll angle of player aircraft in degrees.
+        Yaw: yaw angle of player aircraft in degrees.
+        Step: Step in the groove.
+        Grade: Current LSO grade.
+        Points: Current points for the pass.
+        Details: Detailed grading analysis.
+    """
+
+    # DCS type names of carrier capable aircraft, Airboss appends them to the pilot name in trapsheet file names
+    AIRFRAMES = ("FA-18C_hornet", "F-14A-135-GR", "F-14B", "AV8BNA", "T-45", "A-4E-C", "Su-33", "J-11A", "MiG-29K")
+    FILE_NAME = re.compile(r"^(?:AIRBOSS-(?P<carrier>.+?)_)?(?:Trapsheet|TRAP)-(?P<name>.*)-(?P<number>\d+)\.csv$")
+
+    @staticmethod
+    def numeric_columns() -> list:
+        return [K.time(), K.rho(), K.x(), K.z(), K.alt(), K.aoa(), K.gse(), K.lue(), K.vtot(), K.vy(),
+                K.gamma(), K.pitch(), K.roll(), K.yaw(), K.points()]
+
+    @staticmethod
+    def text_columns() -> list:
+        return [K.step(), K.grade(), K.details()]
+
+    @staticmethod
+    def columns() -> list:
+        return [K.time(), K.rho(), K.x(), K.z(), K.alt(), K.aoa(), K.gse(), K.lue(), K.vtot(), K.vy(),
+                K.gamma(), K.pitch(), K.roll(), K.yaw(), K.step(), K.grade(), K.points(), K.details()]
+
+    @staticmethod
+    def dtypes() -> dict:
+        dtypes = {column: "float64" for column in Trapsheet.numeric_columns()}
+        dtypes.update({column: str for column in Trapsheet.text_columns()})
+        return dtypes
+
+    @staticmethod
+    def metadata(file_path: str) -> dict:
+        """ carrier, pilot, callsign, player, airframe and pass number encoded in the Airboss file name
+            'AIRBOSS-<carrier>_Trapsheet-<pilot>_<airframe>-<pass>.csv', missing parts are None
+        """
+        meta = {"carrier": None, "pilot": None, "callsign": None, "player": None, "airframe": None, "number": None}
+        match = Trapsheet.FILE_NAME.match(os.path.basename(file_path))
+        if not match:
+            return meta
+        name = match.group("name")
+        for airframe in Trapsheet.AIRFRAMES:
+            if name.endswith("_" + airframe) or name == airframe:
+                meta["airframe"] = airframe
+                name = name[:-len(airframe)].rstrip("_")
+                break
+        else:
+            name, _, meta["airframe"] = name.rpartition("_")
+        # Airboss replaces the '|' of 'Callsign | Player' with '_'
+        callsign, _, player = name.partition(" _ ")
+        meta.update({"carrier": match.group("carrier"), "pilot": name or None, "callsign": callsign or None,
+                     "player": player or None, "number": int(match.group("number"))})
+        return meta
+
+    @staticmethod
+    def load(file_path: str) -> "pd.DataFrame":
+        """ Reads an Airboss trapsheet in one pass. Airboss writes the header as '#Time,Rho,...' and pads the
+            Details column with blanks, both are handled here so the file can be read as is.
+        """
+        # imported here: file name parsing must not pull pandas into commands that never read a pass
+        import pandas as pd
+
+        with open(file_path, "r") as data_file:
+            header = data_file.readline().lstrip("#").strip().split(",")
+            data = pd.read_csv(data_file, names=header, header=None, usecols=Trapsheet.columns(),
+                               dtype=Trapsheet.dtypes(), keep_default_na=False, na_values={K.points(): ["n/a"]})
+        data[K.details()] = data[K.details()].str.strip()
+        return data[Trapsheet.columns()]
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules.Trapsheet import Trapsheet
+
+
+class TrapsheetCache(object):
+    """ On-disk cache of parsed trapsheets, one directory per pass holding a .npy file per column.
+        Entries are keyed by the absolute source path and checked against its size and mtime, a changed
+        source is parsed again and its entry overwritten.
+    """
+    VERSION = 1
+    META = "meta.json"
+
+    def __init__(self, cache_dir: str):
+        self.__cache_dir = cache_dir
+
+    def entry_dir(self, file_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.__cache_dir, key)
+
+    @staticmethod
+    def __signature(file_path: str) -> dict:
+        stat = os.stat(file_path)
+        return {"source": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "version": TrapsheetCache.VERSION}
+
+    def columns(self, file_path: str, names: list = None, mmap_mode: str = "r"):
+        """ Memory-mapped column arrays of a cached pass (all of them or just `names`), None when there is no valid
+            entry
+        """
+        entry_dir = self.entry_dir(file_path)
+        try:
+            with open(os.path.join(entry_dir, self.META), "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if {k: meta.get(k) for k in ("source", "size", "mtime_ns", "version")} != self.__signature(file_path):
+            return None
+        return {column: np.load(os.path.join(entry_dir, column + ".npy"), mmap_mode=mmap_mode)
+                for column in (meta["columns"] if names is None else names)}
+
+    def store(self, file_path: str, data: pd.DataFrame):
+        signature = self.__signature(file_path)
+        entry_dir = self.entry_dir(file_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        meta_path = os.path.join(entry_dir, self.META)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        # every file is written aside and renamed over the old one: a reader (another batch worker) maps either the
+        # old or the new column, never a partial one. The temporary names are per process, workers may store the
+        # same pass at once.
+        tmp = ".%d.tmp" % os.getpid()
+        for column in data.columns:
+            values = data[column].to_numpy()
+            if column in Trapsheet.text_columns():
+                values = values.astype(str)
+            column_path = os.path.join(entry_dir, column + ".npy")
+            with open(column_path + tmp, "wb") as column_file:
+                np.save(column_file, values, allow_pickle=False)
+            os.replace(column_path + tmp, column_path)
+        # meta goes last: an entry without it is never read
+        signature.update({"columns": list(data.columns), "rows": len(data)})
+        with open(meta_path + tmp, "w") as meta_file:
+            json.dump(signature, meta_file)
+        os.replace(meta_path + tmp, meta_path)
+
+    def arrays(self, file_path: str, names: list = None) -> dict:
+        """ column -> array of a pass, memory-mapped from the cache; parsed and cached first on a miss """
+        columns = self.columns(file_path, names)
+        if columns is None:
+            self.store(file_path, Trapsheet.load(file_path))
+            columns = self.columns(file_path, names)
+        return columns
+
+    def load(self, file_path: str) -> pd.DataFrame:
+        columns = self.columns(file_path)
+        if columns is not None:
+            return pd.DataFrame(columns)
+        data = Trapsheet.load(file_path)
+        self.store(file_path, data)
+        return data
@@ -0,0 +1,128 @@
+import fnmatch
+import json
+import os
+import time
+
+from modules.Batch import Batch
+from modules.Metrics import Metrics
+from modules.Utils import Bcolors
+
+
+class Manifest(object):
+    """ Files already processed by the watcher: path -> size, mtime, outputs (and the error of a failed render) """
+
+    def __init__(self, file_path: str):
+        self.__file_path = file_path
+        try:
+            with open(file_path, "r") as manifest_file:
+                self.__entries = json.load(manifest_file)
+        except FileNotFoundError:
+            self.__entries = {}
+
+    def processed(self, path: str, size: int, mtime_ns: int) -> bool:
+        entry = self.__entries.get(path)
+        return entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+    def record(self, path: str, size: int, mtime_ns: int, outputs: list = None, error: str = None):
+        self.__entries[path] = {"size": size, "mtime_ns": mtime_ns, "outputs": outputs or [], "error": error}
+
+    def outputs(self, path: str) -> list:
+        return self.__entries.get(path, {}).get("outputs", [])
+
+    def save(self):
+        directory = os.path.dirname(self.__file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.__file_path + ".tmp", "w") as manifest_file:
+            json.dump(self.__entries, manifest_file)
+        os.replace(self.__file_path + ".tmp", self.__file_path)
+
+
+class Watcher(object):
+    """ Polls a directory for new or changed trapsheets and LSO grades files and processes each one once it is
+        fully written, i.e. its size and mtime did not change for `settle` seconds. run() keeps the batch's render
+        pool for its whole lifetime, a poll does not pay for starting workers.
+    """
+    GRADES_PATTERN = "AIRBOSS-*_LSOgrades.csv"
+
+    def __init__(self, work_dir: str, manifest: Manifest, batch: Batch, interval: float = 2.,
+                 settle: float = 2., on_grades=None):
+        self.__work_dir = work_dir
+        self.__manifest = manifest
+        self.__batch = batch
+        self.__interval = interval
+        self.__settle = settle
+        self.__on_grades = on_grades
+        self.__pending = {}
+
+    def scan(self) -> list:
+        """ (path, size, mtime_ns) of the trapsheets and grades files not in the manifest with that size and mtime """
+        changed = []
+        with os.scandir(self.__work_dir) as entries:
+            for entry in entries:
+                if not (fnmatch.fnmatch(entry.name, Batch.TRAPSHEET_PATTERN)
+                        or fnmatch.fnmatch(entry.name, self.GRADES_PATTERN)):
+                    continue
+                stat = entry.stat()
+                path = os.path.abspath(entry.path)
+                if not self.__manifest.processed(path, stat.st_size, stat.st_mtime_ns):
+                    changed.append((path, stat.st_size, stat.st_mtime_ns))
+        return changed
+
+    def baseline(self):
+        """ Marks everything currently in the directory as processed without rendering it """
+        for path, size, mtime_ns in self.scan():
+            self.__manifest.record(path, size, mtime_ns, outputs=self.__manifest.outputs(path))
+        self.__manifest.save()
+
+    def __ready(self, changed: list) -> list:
+        now = time.time_ns()
+        ready = []
+        pending = {}
+        for path, size, mtime_ns in changed:
+            settled = now - mtime_ns >= self.__settle * 1e9
+            if self.__pending.get(path) == (size, mtime_ns) and settled:
+                ready.append((path, size, mtime_ns))
+            else:
+                pending[path] = (size, mtime_ns)
+        self.__pending = pending
+        return ready
+
+    def poll(self) -> list:
+        """ Processes whatever became ready since the last poll, returns the processed paths """
+        ready = self.__ready(self.scan())
+        if not ready:
+            return []
+        signatures = {path: (size, mtime_ns) for path, size, mtime_ns in ready}
+
+        trapsheets = [path for path in signatures
+                      if fnmatch.fnmatch(os.path.basename(path), Batch.TRAPSHEET_PATTERN)]
+        if trapsheets:
+            report = self.__batch.run(trapsheets)
+            print(report)
+            for result in report.results:
+                self.__manifest.record(result.file_path, *signatures[result.file_path], outputs=result.outputs,
+                                       error=result.error)
+
+        for path in signatures:
+            if path in trapsheets:
+                continue
+            error = None
+            if self.__on_grades:
+                try:
+                    self.__on_grades(path)
+                except Exception as e:
+                    error = repr(e)
+                    print(Bcolors.FAIL + "FAIL  " + Bcolors.ENDC + "%s: %s" % (path, error))
+            self.__manifest.record(path, *signatures[path], error=error)
+
+        self.__manifest.save()
+        Metrics.flush()
+        return list(signatures)
+
+    def run(self):
+        with self.__batch:
+            while True:
+                started = time.monotonic()
+                self.poll()
+                time.sleep(max(0., self.__interval - (time.monotonic() - started)))
@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+from modules.Bot import AirbossBot, FakeGateway, RenderQueue
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+
+def handle(contents: list, depth: int, out_dir: str) -> tuple:
+    """ Handles the messages through a FakeGateway with a RenderQueue that is never started, so jobs stay queued.
+        Returns the replies and the queue depth.
+    """
+    async def run():
+        gateway = FakeGateway()
+        renderer = RenderQueue(out_dir, workers=1, depth=depth)
+        bot = AirbossBot(gateway, renderer, ASSETS)
+        for content in contents:
+            await bot.handle(gateway.post(content))
+        replies = []
+        while not gateway.replies.empty():
+            replies.append((await gateway.replies.get())[1])
+        return replies, renderer.depth
+
+    return asyncio.run(run())
+
+
+def test_identical_renders_join_one_job(tmp_path):
+    replies, depth = handle(["!trap Colt 2-1 1", "!trap Colt 2-1 1",
+                             "!trap AIRBOSS-CVN_Trapsheet-Colt 2-1 _ Nygus_FA-18C_hornet-0001.csv"], 4, str(tmp_path))
+    assert replies == []
+    assert depth == 1
+
+
+def test_full_queue_replies_busy(tmp_path):
+    replies, depth = handle(["!trap Colt 2-1 1", "!trap Colt 2-1 2"], 1, str(tmp_path))
+    assert replies == ["Busy rendering, try again in a moment"]
+    assert depth == 1
+
+
+def test_unknown_pilot(tmp_path):
+    replies, depth = handle(["!trap nobody"], 4, str(tmp_path))
+    assert replies == ["No trapsheet found for 'nobody'"]
+    assert depth == 0
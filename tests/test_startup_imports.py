@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from modules.Benchmark import Benchmark
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StartupImportsTest(unittest.TestCase):
+    """ The CLI, the bot, the grades store and the watcher start without the plotting and data libraries, commands
+        import those when they need them (see main.py). Checked in a fresh interpreter, as anything imported by the
+        test runner (Benchmark itself imports numpy) would already be in sys.modules.
+    """
+
+    def test_no_heavy_modules(self):
+        code = "import sys\nimport %s\nprint(','.join(m for m in %r if m in sys.modules))" % (
+            ", ".join(Benchmark.STARTUP_IMPORTS), Benchmark.HEAVY_MODULES)
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        heavy = [m for m in output.stdout.strip().split(",") if m]
+        self.assertEqual(heavy, [], "startup imports loaded %s" % ", ".join(heavy))
+
+
+if __name__ == "__main__":
+    unittest.main()